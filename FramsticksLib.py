@@ -1,4 +1,5 @@
 from typing import List  # to be able to specify a type hint of list(something)
+from collections import OrderedDict
 import json
 import sys, os
 import argparse
@@ -22,6 +23,16 @@ class FramsticksLib:
 	PRINT_FRAMSTICKS_OUTPUT: bool = False  # set to True for debugging
 	DETERMINISTIC: bool = False  # set to True to have the same results in each run
 
+	DISSIMILARITY_CACHE_SIZE: int = 200_000  # how many pairwise dissimilarities are remembered (the least recently used ones are forgotten), so that pairs of genotypes that meet again in later generations are not compared again. Each entry takes about _DISSIMILARITY_CACHE_ENTRY_BYTES of memory. Set to 0 to disable. Call clearDissimilarityCache() after changing SimilMeasure settings
+	DISSIMILARITY_CACHE_MEMORY_MB: float = None  # if set, the dissimilarity cache holds as many entries as fit in this much memory instead of DISSIMILARITY_CACHE_SIZE
+	GENO_CACHE_SIZE: int = 2000  # how many Geno objects parsed for dissimilarity computations are kept for reuse
+	VOXELS_CACHE_SIZE: int = 2000  # how many voxel representations of creatures computed for density distribution dissimilarity (methods -2, -3) are kept for reuse
+	LEVENSHTEIN_WORKERS: int = 1  # number of threads used by the batch Levenshtein distance kernel (rapidfuzz cdist) for dissimilarity method -1; -1 = all CPU cores
+	CHECK_DISSIMILARITY_SYMMETRY: bool = False  # set to True for debugging: dissimilarity() then computes both triangles of the matrix (instead of the upper one, mirrored) and reports asymmetrical pairs
+	BULK_EXTRACTION: bool = False  # set to True to fetch the evaluation data of the whole gene pool in one FramScript call instead of several ctypes calls per genotype. The first bulk results are compared with those of the genotype-by-genotype loop; if they differ or the script fails (e.g. in a Framsticks version without Simulator.eval()), the loop is used from then on
+
+	_DISSIMILARITY_CACHE_ENTRY_BYTES = 250  # approximate memory used by one entry of the dissimilarity cache (key tuple, float value and OrderedDict bookkeeping)
+
 	GENOTYPE_INVALID = "/*invalid*/"  # this is how genotype invalidity is represented in Framsticks
 	EVALUATION_SETTINGS_FILE = [  # all files MUST be compatible with the standard-eval expdef. The order they are loaded in is important!
 		"eval-allcriteria.sim",  # a good trade-off in performance sampling period ("perfperiod") for vertpos and velocity
@@ -31,6 +42,18 @@ class FramsticksLib:
 	]
 
 
+	_EXTRACT_EVALUATIONS_SCRIPT = """
+		var pool = GenePools[0];
+		var results = [];
+		for (var i = 0; i < pool.size; i++)
+		{
+			var g = pool.get(i);
+			results.add([g.num, g.name, g.data[ExpProperties.evalsavedata]]);
+		}
+		return String.serialize(results);
+	"""  # the same fields as the genotype-by-genotype loop in _extractEvaluations() reads, see _extractEvaluationsBulk()
+
+
 	# This function is not needed because in Python, "For efficiency reasons, each module is only imported once per interpreter session."
 	# @staticmethod
 	# def getFramsModuleInstance():
@@ -41,6 +64,13 @@ class FramsticksLib:
 
 	def __init__(self, frams_path, frams_lib_name, sim_settings_files):
 		self.dissim_measure_density_distribution = None  # will be initialized only when necessary (for rare dissimilarity methods)
+		self.pool = None  # optional pool of worker processes, each with its own FramsticksLib instance (see evolvengine/pool.py). When set, evaluate() is delegated to it
+		self._dissimilarity_cache = OrderedDict()  # (method, hash of one genotype, hash of the other genotype) -> dissimilarity, the least recently used first
+		self._geno_cache = OrderedDict()  # genotype -> Geno object, the least recently used first
+		self._voxels_cache = OrderedDict()  # genotype -> voxels for density distribution dissimilarity, the least recently used first
+		self.dissimilarity_cache_hits = 0
+		self.dissimilarity_cache_misses = 0
+		self._bulk_extraction_checked = False  # whether the results of _extractEvaluationsBulk() have been found equal to those of _extractEvaluations()
 
 		if frams_lib_name is None:
 			frams.init(frams_path)  # could add support for setting alternative directories using -D and -d
@@ -91,6 +121,21 @@ class FramsticksLib:
 		return (model.numparts._int(), model.numjoints._int(), model.numneurons._int(), model.numconnections._int())
 
 
+	def getF0(self, genotype: str):
+		"""
+		Returns the f0 genotype of a phenotype built from the provided genotype (without any simulation).
+		Different genotypes, also in different genetic formats, that build the same body and brain yield the same f0 genotype.
+
+		:param genotype: the genotype to convert
+		:return: the f0 genotype or None if the genotype is invalid or cannot be converted.
+		"""
+		geno = frams.Geno.newFromString(genotype)
+		if geno.is_valid._int() == 0:
+			return None
+		f0 = geno.f0genotype._string()
+		return f0 if f0 != "" else None
+
+
 	def satisfiesConstraints(self, genotype: str, max_numparts: int, max_numjoints: int, max_numneurons: int, max_numconnections: int, max_numgenochars: int) -> bool:
 		"""
 		Verifies if the genotype satisfies complexity constraints without actually simulating it.
@@ -131,6 +176,9 @@ class FramsticksLib:
 		"""
 		assert isinstance(genotype_list, list)  # because in python, str has similar capabilities as list and here it would pretend to work too, so to avoid any ambiguity
 
+		if self.pool is not None:
+			return self.pool.evaluate(genotype_list)  # the results come back in the order of genotype_list
+
 		if not self.PRINT_FRAMSTICKS_OUTPUT:
 			ec = frams.MessageCatcher.new()  # mute potential errors, warnings, messages
 			ec.store = 2;  # store all, because they are caught by MessageCatcher and will not appear in output
@@ -157,6 +205,14 @@ class FramsticksLib:
 				print(ec.messages)  # if errors occurred, output all caught messages for debugging
 				raise RuntimeError("[ERROR] %d error(s) and %d warning(s) while evaluating %d genotype(s)" % (ec.error_count._value(), ec.warning_count._value(), len(genotype_list)))  # make errors fatal; by default they stop the simulation anyway so let's not use potentially incorrect or partial results and fix the cause first.
 
+		if self.BULK_EXTRACTION:
+			results = self._tryExtractEvaluationsBulk(len(genotype_list))
+			if results is not None:
+				return results
+		return self._extractEvaluations()
+
+
+	def _extractEvaluations(self):
 		results = []
 		for g in frams.GenePools[0]:
 			serialized_dict = frams.String.serialize(g.data[frams.ExpProperties.evalsavedata._value()])
@@ -168,6 +224,38 @@ class FramsticksLib:
 		return results
 
 
+	def _extractEvaluationsBulk(self):
+		"""
+		Same results as the genotype-by-genotype loop of _extractEvaluations(), but the whole gene pool is serialized by FramScript in one call
+		and decoded by one json.loads(), so the cost grows with the number of bytes transferred and not with the number of ctypes calls.
+		"""
+		serialized_pool = frams.Simulator.eval(self._EXTRACT_EVALUATIONS_SCRIPT)._string()
+		return [{"num": num, "name": name, "evaluations": evaluations} for num, name, evaluations in json.loads(serialized_pool)]
+
+
+	def _tryExtractEvaluationsBulk(self, expected_count: int):
+		"""
+		:return: the results of _extractEvaluationsBulk(), or None if they cannot be used. The first results are checked against _extractEvaluations(); after a failure or a difference, BULK_EXTRACTION is set to False for this object, so the failed FramScript call and the message are not repeated for every batch.
+		"""
+		try:
+			results = self._extractEvaluationsBulk()
+		except (AttributeError, TypeError, ValueError) as e:  # no Simulator.eval() in this Framsticks version, or the script did not return the expected JSON list of [num, name, evaluations]
+			problem = "failed (%s)" % e
+		else:
+			if len(results) != expected_count:
+				problem = "returned %d evaluations for %d genotypes" % (len(results), expected_count)
+			elif self._bulk_extraction_checked:
+				return results
+			elif results == self._extractEvaluations():
+				self._bulk_extraction_checked = True
+				return results
+			else:
+				problem = "returned different evaluations than the genotype-by-genotype loop"
+		print("Bulk extraction of evaluations %s, using the genotype-by-genotype loop from now on" % problem)
+		self.BULK_EXTRACTION = False
+		return None
+
+
 	def mutate(self, genotype_list: List[str]) -> List[str]:
 		"""
 		Returns:
@@ -198,38 +286,229 @@ class FramsticksLib:
 		"""
 		assert isinstance(genotype_list, list)  # because in python, str has similar capabilities as list and here it would pretend to work too, so to avoid any ambiguity
 
-		# if you want to override what EVALUATION_SETTINGS_FILE sets, you can do it below:
+		# if you want to override what EVALUATION_SETTINGS_FILE sets, you can do it below (and then call clearDissimilarityCache()):
 		# frams.SimilMeasureHungarian.simil_partgeom = 1
 		# frams.SimilMeasureHungarian.simil_weightedMDS = 1
 
 		n = len(genotype_list)
 		square_matrix = np.zeros((n, n))
 
+		if method in (-2, -3):
+			self._prepareDensityDistribution(method)
+		elif method not in (0, 1, 2, -1):
+			raise ValueError("Don't know what to do with dissimilarity method = %d" % method)
+
+		if method == -1:  # the batch kernel computes the whole matrix faster than pairs could be looked up in the dissimilarity cache
+			square_matrix = self.levenshteinMatrix(genotype_list)
+		elif self.CHECK_DISSIMILARITY_SYMMETRY:  # both triangles, and not from the cache which does not distinguish (a,b) from (b,a)
+			if method in (-2, -3):
+				square_matrix = self.dissim_measure_density_distribution.getDissimilarityMatrix(genotype_list)
+			else:
+				all_pairs = [(i, j) for i in range(n) for j in range(n)]
+				square_matrix = np.array(self.dissimilarityPairs(genotype_list, method, all_pairs, use_cache=False)).reshape(n, n)
+		else:  # distances are symmetric, so only the upper triangle is computed (or taken from the cache) and then mirrored
+			upper_pairs = [(i, j) for i in range(n) for j in range(i + 1, n)]
+			if method in (-2, -3):
+				distances = self._cachedPairDistances(genotype_list, method, upper_pairs, lambda missing_pairs: self._densityDistributionDistances(genotype_list, missing_pairs))
+			else:
+				distances = self.dissimilarityPairs(genotype_list, method, upper_pairs)
+			for (i, j), distance in zip(upper_pairs, distances):
+				square_matrix[i][j] = distance
+			square_matrix += square_matrix.T
+
+		for i in range(n):
+			assert square_matrix[i][i] == 0, "Not a correct dissimilarity matrix, diagonal expected to be 0"
+		if self.CHECK_DISSIMILARITY_SYMMETRY:
+			self._checkDissimilaritySymmetry(square_matrix)
+		return square_matrix
+
+
+	def dissimilarityBetween(self, genotype_list1: List[str], genotype_list2: List[str], method: int) -> np.ndarray:
+		"""
+			:param method: the same as in dissimilarity().
+			:return: A len(genotype_list1) x len(genotype_list2) array with dissimilarities of each genotype in genotype_list1 to each genotype in genotype_list2. Only these pairs are computed, not the full square matrix of both lists.
+		"""
+		assert isinstance(genotype_list1, list) and isinstance(genotype_list2, list)
+		n1, n2 = len(genotype_list1), len(genotype_list2)
+		if n1 == 0 or n2 == 0:
+			return np.zeros((n1, n2))
+		if method == -1:
+			return self.levenshteinMatrix(genotype_list1, genotype_list2)
+		genotype_list = genotype_list1 + genotype_list2
+		pairs = [(i, n1 + j) for i in range(n1) for j in range(n2)]
+		if method in (-2, -3):
+			self._prepareDensityDistribution(method)
+			distances = self._cachedPairDistances(genotype_list, method, pairs, lambda missing_pairs: self._densityDistributionDistances(genotype_list, missing_pairs))
+		else:
+			distances = self.dissimilarityPairs(genotype_list, method, pairs)
+		return np.array(distances).reshape(n1, n2)
+
+
+	def levenshteinMatrix(self, query_genotypes: List[str], reference_genotypes: List[str] = None, workers: int = None) -> np.ndarray:
+		"""
+			Genetic Levenshtein distances computed in one call of a C-level batch kernel (rapidfuzz cdist), e.g. to compare a population with itself or new genotypes with an archive.
+
+			:param reference_genotypes: if None, query_genotypes are compared with themselves.
+			:param workers: number of threads, LEVENSHTEIN_WORKERS if None; -1 = all CPU cores.
+			:return: A len(query_genotypes) x len(reference_genotypes) array of distances.
+		"""
+		if reference_genotypes is None:
+			reference_genotypes = query_genotypes
+		try:
+			from rapidfuzz.process import cdist
+			from rapidfuzz.distance import Levenshtein as rapidfuzz_Levenshtein
+		except ImportError:  # rapidfuzz comes with recent versions of the Levenshtein module, older ones need the loop
+			import Levenshtein
+			distances = np.zeros((len(query_genotypes), len(reference_genotypes)))
+			for i, g1 in enumerate(query_genotypes):
+				for j, g2 in enumerate(reference_genotypes):
+					distances[i][j] = Levenshtein.distance(g1, g2)
+			return distances
+		return cdist(query_genotypes, reference_genotypes, scorer=rapidfuzz_Levenshtein.distance, dtype=np.float64,
+		             workers=self.LEVENSHTEIN_WORKERS if workers is None else workers)
+
+
+	def dissimilarityPairs(self, genotype_list: List[str], method: int, pairs, use_cache: bool = True) -> List[float]:
+		"""
+			:param method: -1 = genetic Levenshtein distance; 0, 1, 2 = phenetic dissimilarity (SimilMeasureGreedy, SimilMeasureHungarian, SimilMeasureDistribution).
+			:param pairs: list of (i, j) index pairs in genotype_list.
+			:param use_cache: if True, pairs remembered in the dissimilarity cache are not computed again and the computed ones are remembered.
+			:return: Dissimilarities of genotype_list[i] and genotype_list[j] for each pair, in the order of pairs.
+		"""
+		if use_cache:
+			return self._cachedPairDistances(genotype_list, method, pairs, lambda missing_pairs: self._computePairDistances(genotype_list, method, missing_pairs))
+		return self._computePairDistances(genotype_list, method, pairs)
+
+
+	def _computePairDistances(self, genotype_list: List[str], method: int, pairs) -> List[float]:
+		if not pairs:
+			return []
+		if self.pool is not None and method != -1:  # Levenshtein distance is too cheap to be worth sending to other processes
+			return self.pool.dissimilarityPairs(genotype_list, method, pairs)
+		distance = self._pairDistanceFunction(genotype_list, method)
+		return [distance(i, j) for i, j in pairs]
+
+
+	def _cachedPairDistances(self, genotype_list: List[str], method: int, pairs, compute) -> List[float]:
+		"""
+			:param compute: function that computes dissimilarities for a list of pairs missing in the cache.
+		"""
+		capacity = self._dissimilarityCacheCapacity()
+		if capacity <= 0:
+			return compute(pairs)
+		cache = self._dissimilarity_cache
+		distances = [None] * len(pairs)
+		missing = {}  # cache key -> positions in pairs, so that a pair of genotypes requested many times (e.g. duplicated individuals) is computed once
+		for k, (i, j) in enumerate(pairs):
+			# content-addressed and independent of the order of genotypes in the pair
+			key = (method,) + tuple(sorted((hash(genotype_list[i]), hash(genotype_list[j]))))
+			distance = cache.get(key)
+			if distance is not None:
+				cache.move_to_end(key)
+				distances[k] = distance
+			else:
+				missing.setdefault(key, []).append(k)
+		self.dissimilarity_cache_hits += len(pairs) - sum(len(positions) for positions in missing.values())
+		self.dissimilarity_cache_misses += len(missing)
+		if missing:
+			computed = compute([pairs[positions[0]] for positions in missing.values()])
+			for (key, positions), distance in zip(missing.items(), computed):
+				for k in positions:
+					distances[k] = distance
+				cache[key] = distance
+			while len(cache) > capacity:
+				cache.popitem(last=False)
+		return distances
+
+
+	def _dissimilarityCacheCapacity(self) -> int:
+		if self.DISSIMILARITY_CACHE_MEMORY_MB is not None:
+			return int(self.DISSIMILARITY_CACHE_MEMORY_MB * 2 ** 20 / self._DISSIMILARITY_CACHE_ENTRY_BYTES)
+		return self.DISSIMILARITY_CACHE_SIZE
+
+
+	def _prepareDensityDistribution(self, method: int):
+		if self.dissim_measure_density_distribution is None:
+			from dissimilarity.density_distribution import DensityDistribution
+			self.dissim_measure_density_distribution = DensityDistribution(frams)
+		self.dissim_measure_density_distribution.frequency = (method == -3)
+
+
+	def _densityDistributionDistances(self, genotype_list: List[str], pairs) -> List[float]:
+		dissim_measure = self.dissim_measure_density_distribution
+		if not hasattr(dissim_measure, "calculateDissimforVoxels"):  # a version of DensityDistribution that only computes whole matrices
+			matrix = dissim_measure.getDissimilarityMatrix(genotype_list)
+			return [matrix[i][j] for i, j in pairs]
+		# converting a genotype to voxels is the expensive part; signatures depend on both creatures of a pair, so only voxels can be reused
+		voxels = {}
+		for pair in pairs:
+			for i in pair:
+				if i not in voxels:
+					voxels[i] = self._getVoxels(genotype_list[i])
+		return [dissim_measure.calculateDissimforVoxels(voxels[i], voxels[j]) for i, j in pairs]
+
+
+	def _getVoxels(self, genotype: str):
+		voxels = self._voxels_cache.pop(genotype, None)
+		if voxels is None:
+			voxels = self.dissim_measure_density_distribution.getVoxels(genotype)
+		self._voxels_cache[genotype] = voxels  # now the most recently used
+		if len(self._voxels_cache) > self.VOXELS_CACHE_SIZE:
+			self._voxels_cache.popitem(last=False)
+		return voxels
+
+
+	def dissimilarityCacheStats(self) -> dict:
+		"""
+			:return: Number of cache hits, misses (computed pairs), the hit rate and the number of remembered pairs.
+		"""
+		requests = self.dissimilarity_cache_hits + self.dissimilarity_cache_misses
+		return {"hits": self.dissimilarity_cache_hits,
+		        "misses": self.dissimilarity_cache_misses,
+		        "hit_rate": self.dissimilarity_cache_hits / requests if requests > 0 else 0.0,
+		        "size": len(self._dissimilarity_cache)}
+
+
+	def clearDissimilarityCache(self):
+		self._dissimilarity_cache.clear()
+		self._geno_cache.clear()
+		self._voxels_cache.clear()
+
+
+	def _getGeno(self, genotype: str):
+		geno = self._geno_cache.pop(genotype, None)
+		if geno is None:
+			geno = frams.Geno.newFromString(genotype)
+		self._geno_cache[genotype] = geno  # now the most recently used
+		if len(self._geno_cache) > self.GENO_CACHE_SIZE:
+			self._geno_cache.popitem(last=False)
+		return geno
+
+
+	def _pairDistanceFunction(self, genotype_list: List[str], method: int):
+		"""
+			:return: A function of (i, j) that computes the dissimilarity of genotype_list[i] and genotype_list[j].
+		"""
 		if method in (0, 1, 2):  # Framsticks phenetic dissimilarity methods
 			frams.SimilMeasure.simil_type = method
-			genos = []  # prepare an array of Geno objects so that we don't need to convert raw strings to Geno objects all the time in loops
-			for g in genotype_list:
-				genos.append(frams.Geno.newFromString(g))
+			genos = {}  # Geno objects of this genotype_list, so that we don't need to convert raw strings to Geno objects all the time in loops. Parsed genos are also reused between calls, see _getGeno()
 			frams_evaluateDistance = frams.SimilMeasure.evaluateDistance  # cache function reference for better performance in loops
-			for i in range(n):
-				for j in range(n):  # maybe calculate only one triangle if you really need a 2x speedup
-					square_matrix[i][j] = frams_evaluateDistance(genos[i], genos[j])._double()
+
+			def geno(i):
+				if i not in genos:
+					genos[i] = self._getGeno(genotype_list[i])
+				return genos[i]
+
+			return lambda i, j: frams_evaluateDistance(geno(i), geno(j))._double()
 		elif method == -1:
 			import Levenshtein
-			for i in range(n):
-				for j in range(n):  # maybe calculate only one triangle if you really need a 2x speedup
-					square_matrix[i][j] = Levenshtein.distance(genotype_list[i], genotype_list[j])
-		elif method in (-2, -3):
-			if self.dissim_measure_density_distribution is None:
-				from dissimilarity.density_distribution import DensityDistribution
-				self.dissim_measure_density_distribution = DensityDistribution(frams)
-			self.dissim_measure_density_distribution.frequency = (method == -3)
-			square_matrix = self.dissim_measure_density_distribution.getDissimilarityMatrix(genotype_list)
-		else:
-			raise ValueError("Don't know what to do with dissimilarity method = %d" % method)
+			return lambda i, j: Levenshtein.distance(genotype_list[i], genotype_list[j])
+		raise ValueError("Don't know how to compute pairwise dissimilarity for method = %d" % method)
 
-		for i in range(n):
-			assert square_matrix[i][i] == 0, "Not a correct dissimilarity matrix, diagonal expected to be 0"
+
+	@staticmethod
+	def _checkDissimilaritySymmetry(square_matrix: np.ndarray):
+		n = len(square_matrix)
 		non_symmetric_diff = square_matrix - square_matrix.T
 		non_symmetric_count = np.count_nonzero(non_symmetric_diff)
 		if non_symmetric_count > 0:
@@ -244,7 +523,6 @@ class FramsticksLib:
 			       n * (n - 1) / 2,
 			       non_symmetric_diff_abs[max_pos2d_XY],
 			       non_symmetric_diff_abs[max_pos2d_XY] * 100 / ((worst_guy_XY + worst_guy_YX) / 2)))  # max diff is not necessarily max %
-		return square_matrix
 
 
 	def getRandomGenotype(self, initial_genotype: str, parts_min: int, parts_max: int, neurons_min: int, neurons_max: int, iter_max: int, return_even_if_failed: bool):
@@ -6,6 +6,65 @@ from FramsticksLib import FramsticksLib
 from base64 import urlsafe_b64encode
 
 
+class PathFitnessReducer:
+    """Computes the COG path fitness of TEST_FUNCTION 3, 4, and 5 from running state, so the path can be fed in chunks (or decimated) and never has to be stored as a whole.
+    The state is the first and the last point, the number of points, the sum of max(0, z), and the sums needed for the squared deviations from the 0..10 ramp: sum of z*z, i*z and i*i, where i is the position of the point in the whole path.
+    The full-path FramsticksLibCompetition._evaluate_path() remains the reference; results agree up to floating point rounding.
+    """
+
+    def __init__(self, test_function):
+        if test_function not in (3, 4, 5):
+            raise RuntimeError("TEST_FUNCTION==%s not implemented!" % test_function)
+        self.test_function = test_function
+        self.count = 0
+        self.next_position = 0  # position in the whole path after the last point
+        self.first = None
+        self.last = None
+        self.sum_positive_z = 0.0
+        self.sum_z_squared = 0.0
+        self.sum_index_z = 0.0
+        self.sum_index_squared = 0.0
+
+    def update(self, points, positions=None):
+        """
+        :param positions: the positions of the points in the whole path, increasing; by default the points directly follow the previous ones. Decimated paths must give them, so that each point is compared with the ramp at its real time.
+        """
+        points = np.asarray(points, dtype=float)
+        if len(points) == 0:
+            return
+        if positions is None:
+            positions = np.arange(self.next_position, self.next_position + len(points))
+        positions = np.asarray(positions, dtype=float)
+        if self.first is None:
+            self.first = points[0]
+        self.last = points[-1]
+        z = points[:, 2]
+        self.sum_positive_z += np.sum(np.maximum(0, z))
+        self.sum_z_squared += z @ z
+        self.sum_index_z += positions @ z
+        self.sum_index_squared += positions @ positions
+        self.count += len(z)
+        self.next_position = positions[-1] + 1
+
+    def result(self):
+        if self.test_function == 3:
+            return np.linalg.norm(self.first - self.last)
+        elif self.test_function == 4:
+            return np.linalg.norm(self.first - self.last) * (
+                self.sum_positive_z / self.count
+            )
+        # test_function 5: the ramp is t_i = 10 * i / (length - 1) for the positions i in the whole path,
+        # so sum((t_i - z_i)^2) = sum(t_i^2) - 2 * sum(t_i * z_i) + sum(z_i^2), averaged over the points used
+        length = self.next_position
+        step = 10 / (length - 1) if length > 1 else 0.0
+        squared_deviations = (
+            step * step * self.sum_index_squared
+            - 2 * step * self.sum_index_z
+            + self.sum_z_squared
+        )
+        return 1000 - np.sqrt(max(squared_deviations, 0.0)) / np.sqrt(self.count)
+
+
 class FramsticksLibCompetition(FramsticksLib):
     """A proxy to FramsticksLib.py with the same interface, but recording the highest achieved fitness and limiting the number of evaluation calls.
     Use it in the same way as FramsticksLib.py.
@@ -24,12 +83,21 @@ class FramsticksLibCompetition(FramsticksLib):
 
     MAX_EVALUATIONS = 100_000  # 100k
     MAX_TIME = 60 * 60 * 1  # 1h (excluding evaluation time)
+    EXIT_ON_BUDGET_EXHAUSTED = True  # exit (via end()) as soon as a batch exceeds the allowed time or number of evaluations. Set to False to only evaluate the part of the batch that fits; the caller should then check isBudgetExhausted(), finish cleanly, and call end()
+    CHARGE_CACHE_HITS = False  # whether evaluations reused by a cache (see chargeCacheHits()) count towards MAX_EVALUATIONS
+    NOT_EVALUATED_KEY = "not_evaluated"  # set in the results of genotypes that were not simulated because the budget was exhausted
 
     TEST_FUNCTION = 3
 
+    STREAMING_PATH_FITNESS = False  # set to True to compute fitness with PathFitnessReducer, feeding the path in chunks of PATH_CHUNK_SIZE points; the body recording is then removed from the returned evaluation data, so it is not kept by caches or callers
+    PATH_DECIMATION = 1  # with STREAMING_PATH_FITNESS, only use every PATH_DECIMATION-th point of the path (and always the last one). Exact for TEST_FUNCTION 3, an approximation for 4 and 5
+    PATH_CHUNK_SIZE = 256
+    CHECK_STREAMING_PATH_FITNESS = False  # with STREAMING_PATH_FITNESS, also compute the full-path fitness and report discrepancies
+
     _best_fitness = None
     _best_solution = None
     _evaluation_count = 0
+    _budget_exhausted = False
     _evaluation_time = (
         0  # used to exclude solution evaluation time from the total running time
     )
@@ -53,37 +121,95 @@ class FramsticksLibCompetition(FramsticksLib):
             )  # simple example: z coordinate of the COG should grow linearly from 0 to 1 during lifespan. Returns RMSE as a deviation measure (negative because we are maximizing, and offset to ensure positive outcomes so there is no clash with other optimization code that may assume that negative fitness indicates an invalid genotype).
         raise RuntimeError("TEST_FUNCTION==%s not implemented!" % self.TEST_FUNCTION)
 
-    def _evaluate_single_genotype(self, genotype):
-        self._evaluation_count += 1
-        if (
-            self._evaluation_count > self.MAX_EVALUATIONS
-            or perf_counter() - self._time0 - self._evaluation_time > self.MAX_TIME
-        ):
-            print("The allowed time or the number of evaluations exceeded")
-            self.end()  # exits the program
-        result = super().evaluate(
-            [genotype]
-        )  # sample result for invalid genotype: [{'num': 172, 'name': 'Agoha Syhy', 'evaluations': None}]
-        valid_result = result[0]["evaluations"] is not None
-        fitness = (
-            self._evaluate_path(result[0]["evaluations"][""]["data->bodyrecording"])
-            if valid_result
-            else None
-        )
-        if fitness is not None and (
-            self._best_fitness is None or self._best_fitness < fitness
-        ):
-            self._best_fitness = fitness
-            self._best_solution = genotype
+    @staticmethod
+    def _row_norms(vectors):
+        # row-wise np.linalg.norm(): the stacked matmul computes the same dot products as norm() does for a single vector, so the results are bitwise identical
+        return np.sqrt((vectors[:, None, :] @ vectors[:, :, None])[:, 0, 0])
+
+    def _evaluate_stacked_paths(self, paths):
+        """Vectorized _evaluate_path() for paths of equal length stacked into an array of shape (number of paths, path length, 3)."""
+        if self.TEST_FUNCTION == 3:
+            return self._row_norms(paths[:, 0] - paths[:, -1])
+        elif self.TEST_FUNCTION == 4:
+            return self._row_norms(paths[:, 0] - paths[:, -1]) * np.mean(
+                np.maximum(0, paths[:, :, 2]), axis=1
+            )
+        elif self.TEST_FUNCTION == 5:
+            length = paths.shape[1]
+            return 1000 - self._row_norms(
+                np.linspace(0, 10, length, endpoint=True) - paths[:, :, 2]
+            ) / np.sqrt(length)
+        raise RuntimeError("TEST_FUNCTION==%s not implemented!" % self.TEST_FUNCTION)
+
+    def _evaluate_paths(self, paths):
+        """
+        :return: the same values as _evaluate_path() called for each path, but computed for the whole batch at once. Paths are grouped by length, and each group is scored as one stacked array.
+        """
+        fitnesses = np.empty(len(paths))
+        indices_by_length = {}
+        for i, path in enumerate(paths):
+            indices_by_length.setdefault(len(path), []).append(i)
+        for indices in indices_by_length.values():
+            fitnesses[indices] = self._evaluate_stacked_paths(
+                np.array([paths[i] for i in indices])
+            )
+        return fitnesses
+
+    def _evaluate_path_streaming(self, path):
+        reducer = PathFitnessReducer(self.TEST_FUNCTION)
+        decimated = path[:: self.PATH_DECIMATION]
+        for start in range(0, len(decimated), self.PATH_CHUNK_SIZE):
+            chunk = decimated[start : start + self.PATH_CHUNK_SIZE]
+            reducer.update(
+                chunk,
+                np.arange(start, start + len(chunk)) * self.PATH_DECIMATION,
+            )
+        if (len(path) - 1) % self.PATH_DECIMATION != 0:
+            # the last point is needed for the distance between birth and death
+            reducer.update(path[-1:], [len(path) - 1])
+        fitness = reducer.result()
+        if self.CHECK_STREAMING_PATH_FITNESS:
+            full_path_fitness = self._evaluate_path(path)
+            if not np.isclose(fitness, full_path_fitness, rtol=1e-9, atol=1e-9):
+                print(
+                    "[WARN] Streaming path fitness %g differs from full-path fitness %g"
+                    % (fitness, full_path_fitness)
+                )
+        return fitness
+
+    def _evaluate_result(self, genotype, result, fitness):
+        # sample result for invalid genotype: {'num': 172, 'name': 'Agoha Syhy', 'evaluations': None}
+        valid_result = result["evaluations"] is not None
+        self._update_best(genotype, fitness)
         if self.SIMPLE_FITNESS_FORMAT:
             return fitness
         else:  # update existing structure (vector of dict of dict...)
             if valid_result:
-                result[0]["evaluations"][""][self.FITNESS_DICT_KEY] = fitness
+                result["evaluations"][""][self.FITNESS_DICT_KEY] = fitness
             else:
-                # result[0]['evaluations'] = {'': {self.FITNESS_KEY: fitness}}  # [{'num': 260, 'name': 'Imepak Syhy', 'evaluations': {'': {'path': None}}}]
+                # result['evaluations'] = {'': {self.FITNESS_KEY: fitness}}  # [{'num': 260, 'name': 'Imepak Syhy', 'evaluations': {'': {'path': None}}}]
                 pass  # leave 'result' as it is, the caller expects such an incomplete structure (with 'evaluations': None) on evaluation failure
-            return result[0]
+            return result
+
+    def _update_best(self, genotype, fitness):
+        if fitness is not None and (
+            self._best_fitness is None or self._best_fitness < fitness
+        ):
+            self._best_fitness = fitness
+            self._best_solution = genotype
+
+    def recordResults(self, genotype_list: List[str], results):
+        """
+        Called by evaluation caches with the results of evaluate() that they reuse instead of evaluating genotype_list again, so that the best solution reported by end() also covers them.
+        """
+        for genotype, result in zip(genotype_list, results):
+            if self.SIMPLE_FITNESS_FORMAT:
+                fitness = result
+            elif result is not None and result["evaluations"] is not None:
+                fitness = result["evaluations"][""].get(self.FITNESS_DICT_KEY)
+            else:
+                fitness = None
+            self._update_best(genotype, fitness)
 
     def evaluate(self, genotype_list: List[str]):
         """
@@ -93,33 +219,181 @@ class FramsticksLibCompetition(FramsticksLib):
             raise RuntimeError(
                 "Too many genotypes to evaluate in one batch: %d" % len(genotype_list)
             )
+        allowed = self._reserve_evaluations(len(genotype_list))
+        if allowed < len(genotype_list) and self.EXIT_ON_BUDGET_EXHAUSTED:
+            # same as when genotypes were evaluated one by one: use what remains of the budget, then exit
+            self._evaluate_genotypes(genotype_list[:allowed])
+            print("The allowed time or the number of evaluations exceeded")
+            self.end()  # exits the program
+        fitnesses = self._evaluate_genotypes(genotype_list[:allowed])
+        # genotypes that did not fit in the budget are not simulated and get the same structure as an evaluation failure,
+        # marked so that caches do not remember them as failures (see evolvengine/cache.py)
+        not_evaluated = (
+            None
+            if self.SIMPLE_FITNESS_FORMAT
+            else {"evaluations": None, self.NOT_EVALUATED_KEY: True}
+        )
+        return fitnesses + [
+            None if not_evaluated is None else dict(not_evaluated)
+            for _ in genotype_list[allowed:]
+        ]
+
+    def _reserve_evaluations(self, count):
+        """
+        Reserves evaluations for a batch before it is dispatched (possibly to many worker processes), so the budget can never be overshot.
+
+        :return: how many genotypes from the beginning of the batch fit in the remaining budget of evaluations and time.
+        """
+        allowed = min(count, self.MAX_EVALUATIONS - self._evaluation_count)
+        if perf_counter() - self._time0 - self._evaluation_time > self.MAX_TIME:
+            allowed = 0
+        allowed = max(allowed, 0)
+        self._evaluation_count += allowed
+        if allowed < count or self._evaluation_count >= self.MAX_EVALUATIONS:
+            self._budget_exhausted = True
+        return allowed
+
+    def isBudgetExhausted(self):
+        """
+        :return: True once a batch had to be trimmed because the allowed time or the number of evaluations was exceeded. The caller should then finish (saving its results) and call end().
+        """
+        return self._budget_exhausted
+
+    def chargeCacheHits(self, count):
+        """
+        Called by evaluation caches for genotypes whose evaluations are to be reused, i.e., not simulated, before the rest of the batch is evaluated. They only count towards the budget if CHARGE_CACHE_HITS is True, and then they are reserved like evaluations.
+
+        :return: how many of the reused evaluations fit in the budget; the cache should pass the others to evaluate(), which reports them as not evaluated.
+        """
+        if not self.CHARGE_CACHE_HITS:
+            return count
+        return self._reserve_evaluations(count)
+
+    def getBudgetState(self):
+        """
+        :return: the used evaluation and time budget and the best solution so far, for setBudgetState() to continue an interrupted run (e.g. from a checkpoint) with what remains of the budget.
+        """
+        return {
+            "evaluation_count": self._evaluation_count,
+            "budget_exhausted": self._budget_exhausted,
+            "evaluation_time": self._evaluation_time,
+            "running_time": perf_counter() - self._time0,
+            "best_fitness": self._best_fitness,
+            "best_solution": self._best_solution,
+        }
+
+    def setBudgetState(self, state):
+        self._evaluation_count = state["evaluation_count"]
+        self._budget_exhausted = state["budget_exhausted"]
+        self._evaluation_time = state["evaluation_time"]
+        # the running time of the interrupted run counts as if it happened just before now
+        self._time0 = perf_counter() - state["running_time"]
+        self._best_fitness = state["best_fitness"]
+        self._best_solution = state["best_solution"]
+
+    def _evaluate_genotypes(self, genotype_list):
+        if len(genotype_list) == 0:
+            return []
         eval_time0 = perf_counter()
+        results = super().evaluate(genotype_list)
+        valid = [
+            i for i, result in enumerate(results) if result["evaluations"] is not None
+        ]
+        if self.STREAMING_PATH_FITNESS:
+            path_fitnesses = [
+                self._evaluate_path_streaming(
+                    results[i]["evaluations"][""].pop("data->bodyrecording")
+                )
+                for i in valid
+            ]
+        else:
+            path_fitnesses = self._evaluate_paths(
+                [results[i]["evaluations"][""]["data->bodyrecording"] for i in valid]
+            )
+        result_fitnesses = [None] * len(results)
+        for i, fitness in zip(valid, path_fitnesses):
+            result_fitnesses[i] = fitness
         fitnesses = [
-            self._evaluate_single_genotype(genotype) for genotype in genotype_list
+            self._evaluate_result(genotype, result, fitness)
+            for genotype, result, fitness in zip(
+                genotype_list, results, result_fitnesses
+            )
         ]
+        # wall-clock time of the whole batch: with a pool of workers their evaluation times overlap, see evaluationTimePerWorker()
         self._evaluation_time += perf_counter() - eval_time0
         return fitnesses
 
+    def evaluationTimePerWorker(self):
+        """
+        :return: a dictionary {worker process id: total time spent evaluating} when evaluation is delegated to a pool of workers (see FramsticksLib.pool), else None.
+        """
+        return None if self.pool is None else dict(self.pool.evaluation_time)
+
     def end(self):
         print("Finishing... best solution =", self._best_fitness)
+        worker_times = self.evaluationTimePerWorker()
+        if worker_times is not None:
+            print(
+                "Evaluation time per worker:",
+                ", ".join("%d: %gs" % item for item in sorted(worker_times.items())),
+            )
+
+        self.saveResults(
+            self.TEST_FUNCTION,
+            self._evaluation_count,
+            perf_counter() - self._time0,
+            self._evaluation_time,
+            self._best_fitness,
+            self._best_solution,
+        )
+        sys.exit()  # only call end() once
+
+    @classmethod
+    def endMerged(cls, test_function, budget_states):
+        """
+        Like end(), but for a run split into many processes (e.g. islands, see evolvengine/islands.py), each with its own FramsticksLibCompetition whose getBudgetState() is in budget_states. Saves one results line with the best solution of all of them, and the number of evaluations and the running and evaluation times summed over them.
+        """
+        best = max(
+            (state for state in budget_states if state["best_fitness"] is not None),
+            key=lambda state: state["best_fitness"],
+            default={"best_fitness": None, "best_solution": None},
+        )
+        print("Finishing... best solution =", best["best_fitness"])
+        cls.saveResults(
+            test_function,
+            sum(state["evaluation_count"] for state in budget_states),
+            sum(state["running_time"] for state in budget_states),
+            sum(state["evaluation_time"] for state in budget_states),
+            best["best_fitness"],
+            best["best_solution"],
+        )
+        sys.exit()
 
-        filename = urlsafe_b64encode(self.COMPETITOR_ID.encode()).decode() + ".results"
-        competitor = "".join(x for x in self.COMPETITOR_ID if x.isalnum())
+    @classmethod
+    def saveResults(
+        cls,
+        test_function,
+        evaluation_count,
+        running_time,
+        evaluation_time,
+        best_fitness,
+        best_solution,
+    ):
+        filename = urlsafe_b64encode(cls.COMPETITOR_ID.encode()).decode() + ".results"
+        competitor = "".join(x for x in cls.COMPETITOR_ID if x.isalnum())
 
         s = strftime("%Y-%m-%d %H:%M")
-        s += "\t%s\t%d\t%d" % (competitor, self.TEST_FUNCTION, self._evaluation_count)
+        s += "\t%s\t%d\t%d" % (competitor, test_function, evaluation_count)
 
-        total_running_time = perf_counter() - self._time0
         s += "\t%g\t%g" % (
-            total_running_time,
-            total_running_time - self._evaluation_time,
+            running_time,
+            running_time - evaluation_time,
         )
 
-        s += "\t" + str(self._best_fitness)
-        s += "\t" + str(self._best_solution)
+        s += "\t" + str(best_fitness)
+        s += "\t" + str(best_solution)
         print(s)
         with open(filename, "a") as outfile:  # append
             outfile.write(s)
             outfile.write("\n")
         print("Saved '%s' (%s)" % (filename, competitor))
-        sys.exit()  # only call end() once
@@ -0,0 +1,57 @@
+import copy
+import timeit
+
+import deap.base
+import deap.creator
+
+import evolvengine.defaults
+
+N_INDIVIDUALS = 1000
+N_REPEATS = 20
+GENOTYPE = "X(X[|-1:1.5],RR[N][*][|G:2.0]X)" * 4
+
+
+def make_population(individual_class: type) -> list:
+    population = [individual_class([GENOTYPE + str(i)]) for i in range(N_INDIVIDUALS)]
+    for i, ind in enumerate(population):
+        ind.fitness.values = (float(i),)
+    return population
+
+
+def measure(name: str, clone, population: list) -> float:
+    seconds = min(
+        timeit.repeat(
+            lambda: [clone(ind) for ind in population], number=1, repeat=N_REPEATS
+        )
+    )
+    print(f"{name:40s} {seconds * 1e6 / len(population):8.2f} us per individual")
+    return seconds
+
+
+def main():
+    deap.creator.create("FitnessMax", deap.base.Fitness, weights=[1.0])
+    # as created by DEAP by default, and as in evolvengine.defaults.setup_toolbox
+    deap.creator.create("DictIndividual", list, fitness=deap.creator.FitnessMax)
+    deap.creator.create(
+        "Individual", evolvengine.defaults.GenotypeIndividual, __slots__=()
+    )
+    dict_population = make_population(deap.creator.DictIndividual)
+    population = make_population(deap.creator.Individual)
+
+    baseline = measure("deepcopy, __dict__ individual", copy.deepcopy, dict_population)
+    measure("deepcopy, __slots__ individual", copy.deepcopy, population)
+    fast = measure(
+        "clone_individual, __slots__ individual",
+        evolvengine.defaults.clone_individual,
+        population,
+    )
+    print(f"Speedup: {baseline / fast:.1f}x")
+
+    clone = evolvengine.defaults.clone_individual(population[1])
+    assert clone == population[1] and clone is not population[1]
+    assert clone.fitness.values == population[1].fitness.values
+    assert clone.fitness is not population[1].fitness
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,153 @@
-import deap.algorithms
+import typing
 
+import deap.base
+import deap.tools
+
+from . import checkpoint as checkpoint_module
 from . import types
+from . import variation
 from .experiments.dpga import dpga
 
 
+def evaluate_invalid(
+    population: list[types.Individual], toolbox: deap.base.Toolbox
+) -> int:
+    invalid_ind = [ind for ind in population if not ind.fitness.valid]
+    fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+    for ind, fit in zip(invalid_ind, fitnesses):
+        ind.fitness.values = fit
+    return len(invalid_ind)
+
+
+def evolve(
+    population: list[types.Individual],
+    toolbox: deap.base.Toolbox,
+    ngen: int,
+    stats: deap.tools.Statistics | None,
+    halloffame: deap.tools.HallOfFame | None,
+    verbose: bool,
+    next_generation: typing.Callable[
+        [list[types.Individual]], tuple[list[types.Individual], int]
+    ],
+) -> tuple[list[types.Individual], deap.tools.Logbook]:
+    # the generational loop of DEAP's eaSimple/eaMuPlusLambda/eaMuCommaLambda, which also
+    # stops early when toolbox.stop() says so (e.g. the evaluation budget is exhausted), and
+    # saves its state with toolbox.checkpoint to resume from toolbox.resume (see checkpoint.py),
+    # and each generation with toolbox.results (see results.py)
+    generation_sinks = [
+        sink
+        for sink in (
+            getattr(toolbox, "checkpoint", None),
+            getattr(toolbox, "results", None),
+        )
+        if sink is not None
+    ]
+    resume = getattr(toolbox, "resume", None)
+    resumed = resume() if resume is not None else None
+
+    def end_generation(gen):
+        state = {"population": population, "halloffame": halloffame, "logbook": logbook}
+        for sink in generation_sinks:
+            sink(gen, state)
+
+    if resumed is None:
+        logbook = deap.tools.Logbook()
+        logbook.header = ["gen", "nevals"] + (stats.fields if stats else [])
+
+        nevals = evaluate_invalid(population, toolbox)
+        if halloffame is not None:
+            halloffame.update(population)
+        record = stats.compile(population) if stats else {}
+        logbook.record(gen=0, nevals=nevals, **record)
+        if verbose:
+            print(logbook.stream)
+        start_gen = 0
+        end_generation(0)
+    else:
+        start_gen, state = resumed
+        population[:] = state["population"]
+        logbook = state["logbook"]
+        checkpoint_module.restore_halloffame(halloffame, state["halloffame"])
+
+    for gen in range(start_gen + 1, ngen + 1):
+        if toolbox.stop():
+            print("Stopping evolution before generation %d" % gen)
+            break
+        population[:], nevals = next_generation(population)
+        record = stats.compile(population) if stats else {}
+        logbook.record(gen=gen, nevals=nevals, **record)
+        if verbose:
+            print(logbook.stream)
+        end_generation(gen)
+    return population, logbook
+
+
+def ea_simple(
+    population: list[types.Individual],
+    toolbox: deap.base.Toolbox,
+    cxpb: float,
+    mutpb: float,
+    ngen: int,
+    stats: deap.tools.Statistics | None = None,
+    halloffame: deap.tools.HallOfFame | None = None,
+    verbose: bool = __debug__,
+) -> tuple[list[types.Individual], deap.tools.Logbook]:
+    def next_generation(population):
+        offspring = toolbox.select(population, len(population))
+        offspring = variation.var_and(offspring, toolbox, cxpb, mutpb)
+        nevals = evaluate_invalid(offspring, toolbox)
+        if halloffame is not None:
+            halloffame.update(offspring)
+        return offspring, nevals
+
+    return evolve(
+        population, toolbox, ngen, stats, halloffame, verbose, next_generation
+    )
+
+
+def ea_mu_lambda(
+    population: list[types.Individual],
+    toolbox: deap.base.Toolbox,
+    cxpb: float,
+    mutpb: float,
+    ngen: int,
+    stats: deap.tools.Statistics | None = None,
+    halloffame: deap.tools.HallOfFame | None = None,
+    verbose: bool = __debug__,
+    *,
+    mu: int,
+    lambda_: int,
+    plus: bool,
+) -> tuple[list[types.Individual], deap.tools.Logbook]:
+    # (mu + lambda) selects survivors from parents and offspring, (mu, lambda) from offspring only
+    assert plus or lambda_ >= mu, "lambda must be greater or equal to mu."
+
+    def next_generation(population):
+        offspring = variation.var_or(population, toolbox, lambda_, cxpb, mutpb)
+        nevals = evaluate_invalid(offspring, toolbox)
+        if halloffame is not None:
+            halloffame.update(offspring)
+        candidates = population + offspring if plus else offspring
+        return toolbox.select(candidates, mu), nevals
+
+    return evolve(
+        population, toolbox, ngen, stats, halloffame, verbose, next_generation
+    )
+
+
 def resolve_algorithm(
     config: types.RunConfig,
 ) -> types.EvolutionaryAlgorithm:
     if config.meta == types.MetaAlgorithm.SIMPLE:
-        return deap.algorithms.eaSimple
+        return ea_simple
     lambda_param = int(config.lambda_ * config.popsize)
     if config.meta == types.MetaAlgorithm.MU_PLUS_LAMBDA:
-        return lambda *args, **kwargs: deap.algorithms.eaMuPlusLambda(
-            *args, **kwargs, mu=config.popsize, lambda_=lambda_param
+        return lambda *args, **kwargs: ea_mu_lambda(
+            *args, **kwargs, mu=config.popsize, lambda_=lambda_param, plus=True
         )
     if config.meta == types.MetaAlgorithm.MU_COMMA_LAMBDA:
-        return lambda *args, **kwargs: deap.algorithms.eaMuCommaLambda(
-            *args, **kwargs, mu=config.popsize, lambda_=lambda_param
+        return lambda *args, **kwargs: ea_mu_lambda(
+            *args, **kwargs, mu=config.popsize, lambda_=lambda_param, plus=False
         )
     if config.meta == types.MetaAlgorithm.DPGA:
         return lambda *args, **kwargs: dpga(
@@ -0,0 +1,168 @@
+import collections
+import json
+import sqlite3
+import typing
+
+from . import counters, types
+
+# results with this key set were not simulated (see FramsticksLibCompetition.evaluate) and are not cached
+NOT_EVALUATED_KEY = "not_evaluated"
+# PRAGMA user_version of the SQLite file: 0 had (namespace, key, result) columns, where key was
+# the genotype string; 1 added the genotype column, so that keys can be canonical
+SCHEMA_VERSION = 1
+
+
+class EvaluationCache:
+    """Memoizes `evaluate` results of a FramsticksLib-compatible object.
+
+    Only valid for deterministic evaluation (e.g. with deterministic.sim), because a genotype
+    that has already been simulated is never simulated again. Entries are kept in an in-memory
+    LRU and, if `path` is given, in an SQLite file that can be shared by many runs (seeds, sweeps).
+    `namespace` must identify everything besides the genotype that influences the result,
+    e.g. the .sim file set. By default entries are keyed by the genotype string; `key_func`
+    can map genotypes to other keys, e.g. `canonical.Canonicalizer.key`. `on_hits` is told how many
+    evaluations of each batch are to be reused before the rest is evaluated, e.g. to reserve them in an
+    evaluation budget, and may return how many of them are allowed; the others are passed to `lib`.
+    `on_hit_results` is given the genotypes and the results of the reused evaluations, e.g. for `lib` to
+    track the best solution among them.
+    Results of genotypes that `lib` did not simulate (e.g. when the budget is exhausted) and empty
+    results are returned but not cached.
+    All other methods are passed through to the wrapped `lib`.
+    """
+
+    def __init__(
+        self,
+        lib: types.FramsticksLibInterface,
+        namespace: str,
+        maxsize: int = 100_000,
+        path: str | None = None,
+        key_func: typing.Callable[[str], str] | None = None,
+        on_hits: typing.Callable[[int], None] | None = None,
+        on_hit_results: typing.Callable[[list[str], list], None] | None = None,
+    ) -> None:
+        self.lib = lib
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.key = key_func if key_func is not None else (lambda genotype: genotype)
+        self.on_hits = on_hits
+        self.on_hit_results = on_hit_results
+        self.hits = counters.Counter()
+        self.misses = counters.Counter()
+        # hits that a plain genotype-string cache would have missed
+        self.key_hits = counters.Counter()
+        # key -> (genotype, serialized result), least recently used first
+        self._entries = collections.OrderedDict()
+        self._db = None if path is None else self._open_db(path)
+
+    def __getattr__(self, name: str):
+        return getattr(self.lib, name)
+
+    def _open_db(self, path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, timeout=60)
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            db.close()
+            raise ValueError(
+                "Cache file '%s' has schema version %d, newer than the supported version %d"
+                % (path, version, SCHEMA_VERSION)
+            )
+        columns = [row[1] for row in db.execute("PRAGMA table_info(evaluations)")]
+        if not columns:
+            db.execute(
+                "CREATE TABLE evaluations (namespace TEXT, key TEXT, genotype TEXT, result TEXT, PRIMARY KEY (namespace, key))"
+            )
+        elif "genotype" not in columns:
+            # files of version 0 were keyed by the genotype string and had no genotype column
+            db.execute("ALTER TABLE evaluations ADD COLUMN genotype TEXT")
+            db.execute("UPDATE evaluations SET genotype = key")
+        db.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+        db.commit()
+        return db
+
+    def __contains__(self, genotype: str) -> bool:
+        return self._get(self.key(genotype)) is not None
+
+    def _get(self, key: str) -> tuple[str, str] | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT genotype, result FROM evaluations WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is not None:
+                self._remember(key, row)
+                return row
+        return None
+
+    def _remember(self, key: str, entry: tuple[str, str]) -> None:
+        self._entries[key] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def evaluate(self, genotype_list: list[str]) -> list:
+        results = [None] * len(genotype_list)
+        # key -> indices in genotype_list, so duplicates within a batch are simulated once
+        missing = {}
+        hits = []  # (index in genotype_list, key, cached entry)
+        for i, genotype in enumerate(genotype_list):
+            key = self.key(genotype)
+            entry = None if key in missing else self._get(key)
+            if entry is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                hits.append((i, key, entry))
+        if self.on_hits is not None and hits:
+            # reused evaluations are charged before the rest of the batch is dispatched
+            allowed = self.on_hits(len(hits))
+            if allowed is not None and allowed < len(hits):
+                for i, key, _ in hits[allowed:]:
+                    missing.setdefault(key, []).append(i)
+                hits = hits[:allowed]
+        for i, _, (cached_genotype, serialized) in hits:
+            if cached_genotype != genotype_list[i]:
+                self.key_hits.add()
+            # json.loads() gives a fresh copy, callers are free to modify it
+            results[i] = json.loads(serialized)
+        if self.on_hit_results is not None and hits:
+            self.on_hit_results(
+                [genotype_list[i] for i, _, _ in hits],
+                [results[i] for i, _, _ in hits],
+            )
+        if missing:
+            evaluated = self.lib.evaluate(
+                [genotype_list[indices[0]] for indices in missing.values()]
+            )
+            new_rows = []
+            for (key, indices), result in zip(missing.items(), evaluated):
+                genotype = genotype_list[indices[0]]
+                serialized = json.dumps(result)
+                if _is_cacheable(result):
+                    self._remember(key, (genotype, serialized))
+                    new_rows.append((self.namespace, key, genotype, serialized))
+                for i in indices:
+                    if genotype_list[i] != genotype:
+                        self.key_hits.add()
+                    results[i] = json.loads(serialized)
+            if self._db is not None and new_rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO evaluations (namespace, key, genotype, result) VALUES (?, ?, ?, ?)",
+                    new_rows,
+                )
+                self._db.commit()
+        self.misses.add(len(missing))
+        self.hits.add(len(hits))
+        return results
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def _is_cacheable(result: typing.Any) -> bool:
+    return result is not None and not (
+        isinstance(result, dict) and result.get(NOT_EVALUATED_KEY)
+    )
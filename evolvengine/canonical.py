@@ -0,0 +1,32 @@
+import functools
+import hashlib
+
+from . import types
+
+
+class Canonicalizer:
+    """Maps genotypes to keys that are equal for phenotypically identical individuals.
+
+    Each genotype is converted to its f0 form (body and brain) with Framsticks and the
+    normalized f0 text is hashed, so e.g. f1 and f4 genotypes or neutral mutations that
+    build the same creature share one key. Genotypes that cannot be converted keep their own string.
+    """
+
+    def __init__(
+        self, lib: types.FramsticksLibInterface, maxsize: int = 100_000
+    ) -> None:
+        self.lib = lib
+        # genotypes repeat a lot between generations
+        self.key = functools.lru_cache(maxsize=maxsize)(self._key)
+
+    @staticmethod
+    def normalize(f0_genotype: str) -> str:
+        lines = (line.strip() for line in f0_genotype.splitlines())
+        return "\n".join(line for line in lines if line and not line.startswith("#"))
+
+    def _key(self, genotype: str) -> str:
+        f0_genotype = self.lib.getF0(genotype)
+        if f0_genotype is None:
+            return "genotype:" + genotype
+        normalized = self.normalize(f0_genotype)
+        return "f0:" + hashlib.sha1(normalized.encode()).hexdigest()
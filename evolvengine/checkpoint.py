@@ -0,0 +1,125 @@
+import os
+import pickle
+import random
+import time
+import typing
+
+import deap.tools
+import numpy as np
+
+
+class Checkpointer:
+    """Saves everything needed to resume evolution where it was interrupted: the state passed by
+    the algorithm (generation, populations, hall of fame, logbook), the Python and NumPy random
+    generators, and the state of registered components, such as mutators or the evaluation budget
+    (see `register`). The random generator of the Framsticks library (used e.g. by mutation and
+    crossing over) is not saved, so a resumed run has the same results as an uninterrupted one only
+    as far as its randomness comes from the Python and NumPy generators.
+
+    Registered as `toolbox.checkpoint`, it is called by the algorithms after every generation and
+    writes a checkpoint every `period` generations, unless writing checkpoints has already taken
+    more than `max_overhead` of the time since the start, in which case the checkpoint is postponed.
+    A checkpoint is written to a temporary file first, which then replaces the previous checkpoint,
+    so a crash while writing never leaves a damaged checkpoint behind.
+    Registered as `toolbox.resume`, it restores the checkpoint from `resume_path` for the algorithm.
+    """
+
+    def __init__(
+        self,
+        path: str | None,
+        period: int = 10,
+        max_overhead: float = 0.05,
+        resume_path: str | None = None,
+    ) -> None:
+        self.path = path
+        self.period = period
+        self.max_overhead = max_overhead
+        self.resume_path = resume_path
+        self.written = 0
+        self.postponed = 0
+        self._components = {}  # name -> (get_state, set_state)
+        self._time_start = time.perf_counter()
+        self._write_time = 0.0
+
+    def register(
+        self,
+        name: str,
+        get_state: typing.Callable[[], typing.Any],
+        set_state: typing.Callable[[typing.Any], None],
+    ) -> None:
+        self._components[name] = (get_state, set_state)
+
+    def register_attributes(
+        self, name: str, obj: typing.Any, attributes: list[str]
+    ) -> None:
+        def get_state() -> dict:
+            return {attribute: getattr(obj, attribute) for attribute in attributes}
+
+        def set_state(state: dict) -> None:
+            for attribute, value in state.items():
+                setattr(obj, attribute, value)
+
+        self.register(name, get_state, set_state)
+
+    def __call__(self, gen: int, state: dict) -> None:
+        if self.path is None or gen % self.period != 0:
+            return
+        elapsed = time.perf_counter() - self._time_start
+        if self.written > 0 and self._write_time > self.max_overhead * elapsed:
+            self.postponed += 1
+            return
+        self.save(gen, state)
+
+    def save(self, gen: int, state: dict) -> None:
+        time_start = time.perf_counter()
+        checkpoint = {
+            "gen": gen,
+            "state": state,
+            "random": random.getstate(),
+            "numpy_random": np.random.get_state(),
+            "components": {
+                name: get_state() for name, (get_state, _) in self._components.items()
+            },
+        }
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "wb") as outfile:
+            pickle.dump(checkpoint, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(temporary_path, self.path)
+        self.written += 1
+        self._write_time += time.perf_counter() - time_start
+
+    def resume(self) -> tuple[int, dict] | None:
+        """Returns the generation and the algorithm state of the checkpoint at `resume_path` (None
+        if there is none), after restoring the random generators and the registered components.
+        """
+        if self.resume_path is None:
+            return None
+        with open(self.resume_path, "rb") as infile:
+            checkpoint = pickle.load(infile)
+        missing = set(self._components) - set(checkpoint["components"])
+        if missing:
+            raise ValueError(
+                "Checkpoint '%s' has no state of: %s"
+                % (self.resume_path, ", ".join(sorted(missing)))
+            )
+        for name, (_, set_state) in self._components.items():
+            set_state(checkpoint["components"][name])
+        random.setstate(checkpoint["random"])
+        np.random.set_state(checkpoint["numpy_random"])
+        print(
+            "Resuming from '%s' after generation %d (the Python and NumPy random generators are"
+            " restored, the random generator of the Framsticks library is not)"
+            % (self.resume_path, checkpoint["gen"])
+        )
+        return checkpoint["gen"], checkpoint["state"]
+
+
+def restore_halloffame(
+    halloffame: deap.tools.HallOfFame | None, saved: deap.tools.HallOfFame | None
+) -> None:
+    # the hall of fame object belongs to the caller of the algorithm, so it is updated in place
+    if halloffame is not None and saved is not None:
+        halloffame.keys[:] = saved.keys
+        halloffame.items[:] = saved.items
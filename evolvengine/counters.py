@@ -0,0 +1,22 @@
+import typing
+
+
+class Counter:
+    """Counts events and reports how many of them happened since the last report.
+
+    `collect` has the signature of a DEAP statistics function, so a counter can be
+    added to the logbook with `stats.register("column", counter.collect)`.
+    """
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.pending = 0
+
+    def add(self, count: int = 1) -> None:
+        self.total += count
+        self.pending += count
+
+    def collect(self, _pop_fitnesses: typing.Any = None) -> int:
+        count = self.pending
+        self.pending = 0
+        return count
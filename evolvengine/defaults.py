@@ -1,3 +1,4 @@
+import functools
 import typing
 import logging
 
@@ -6,7 +7,7 @@ import deap.creator
 import deap.tools
 import numpy as np
 
-from . import types
+from . import cache, distances, sketch, types
 
 
 def is_genotype_valid(genotype: str) -> bool:
@@ -32,29 +33,18 @@ def genotype_within_constraint(
     return True
 
 
-def frams_evaluate(
-    frams_lib: types.FramsticksLibInterface,
-    args: types.RunConfig,
-    individual: types.Individual,
-) -> typing.Union[list[float], float]:
+def evaluation_to_fitness(
+    args: types.RunConfig, genotype: str, data: dict
+) -> list[float]:
     # fitness of -1 is intended to discourage further propagation of this genotype via selection ("this genotype is very poor")
     BAD_FITNESS = [-1] * len(args.opt)
-
-    # individual[0] because we can't (?) have a simple str as a deap genotype/individual, only list of str.
-    genotype = individual[0]
-    if not is_genotype_valid(genotype):
-        logging.error(
-            'Genotype "%s" is /*invalid*/, hence assigned low fitness: %s'
-            % (genotype, BAD_FITNESS)
-        )
+    if isinstance(data, dict) and data.get(cache.NOT_EVALUATED_KEY):
+        # not simulated because the evaluation budget is exhausted, which is not an evaluation problem
         return BAD_FITNESS
 
-    data = frams_lib.evaluate([genotype])
-    # print("Evaluated '%s'" % genotype, 'evaluation is:', data)
     valid = True
     try:
-        first_genotype_data = data[0]
-        evaluation_data = first_genotype_data["evaluations"]
+        evaluation_data = data["evaluations"]
         default_evaluation_data = evaluation_data[""]
         fitness = [default_evaluation_data[crit] for crit in args.opt]
     except (
@@ -88,6 +78,55 @@ def frams_evaluate(
     return fitness
 
 
+def frams_evaluate_batch(
+    frams_lib: types.FramsticksLibInterface,
+    args: types.RunConfig,
+    individuals: list[types.Individual],
+    screen: typing.Callable[[str], bool] | None = None,
+) -> list[list[float]]:
+    # one frams_lib.evaluate() call for the whole batch, so the simulator setup is paid once and not per genotype
+    # individual[0] because we can't (?) have a simple str as a deap genotype/individual, only list of str.
+    genotypes = [individual[0] for individual in individuals]
+    fitnesses = [None] * len(genotypes)
+    to_simulate = []
+    for i, genotype in enumerate(genotypes):
+        if not is_genotype_valid(genotype):
+            fitnesses[i] = [-1] * len(args.opt)
+            logging.error(
+                'Genotype "%s" is /*invalid*/, hence assigned low fitness: %s'
+                % (genotype, fitnesses[i])
+            )
+        elif screen is not None and not screen(genotype):
+            # violates constraints, no need to simulate it
+            fitnesses[i] = [-1] * len(args.opt)
+        else:
+            to_simulate.append(i)
+
+    if to_simulate:
+        data = frams_lib.evaluate([genotypes[i] for i in to_simulate])
+        # print("Evaluated %d genotypes, evaluations are:" % len(to_simulate), data)
+        for i, genotype_data in zip(to_simulate, data):
+            fitnesses[i] = evaluation_to_fitness(args, genotypes[i], genotype_data)
+    return fitnesses
+
+
+def frams_evaluate(
+    frams_lib: types.FramsticksLibInterface,
+    args: types.RunConfig,
+    individual: types.Individual,
+    screen: typing.Callable[[str], bool] | None = None,
+) -> typing.Union[list[float], float]:
+    return frams_evaluate_batch(frams_lib, args, [individual], screen)[0]
+
+
+def frams_map(func: typing.Callable, iterable: typing.Iterable) -> list:
+    # DEAP algorithms evaluate a generation with toolbox.map(toolbox.evaluate, invalid_ind),
+    # so when func is the registered frams_evaluate, the whole generation is sent as one batch
+    if isinstance(func, functools.partial) and func.func is frams_evaluate:
+        return frams_evaluate_batch(*func.args, list(iterable), **func.keywords)
+    return list(map(func, iterable))
+
+
 def frams_crossover(
     frams_lib: types.FramsticksLibInterface,
     individual1: types.Individual,
@@ -126,6 +165,28 @@ def frams_getsimplest(
     )
 
 
+class GenotypeIndividual(list):
+    # base of deap.creator.Individual: one genotype string and a fitness, without a per-instance
+    # __dict__ (deap.creator.create cannot add __slots__ for an attribute it initializes itself)
+    __slots__ = ("fitness",)
+
+    def __init__(self, iterable: typing.Iterable[str] = ()) -> None:
+        super().__init__(iterable)
+        self.fitness = deap.creator.FitnessMax()
+
+
+def clone_individual(individual: types.Individual) -> types.Individual:
+    # an individual is one immutable genotype string and a fitness, so the generic deepcopy
+    # that DEAP registers as toolbox.clone is not needed; __init__s are skipped as well, since
+    # Fitness.__init__ re-validates the weights of the class on every instance
+    clone = list.__new__(type(individual))
+    clone.extend(individual)
+    fitness = object.__new__(type(individual.fitness))
+    fitness.wvalues = individual.fitness.wvalues  # an immutable tuple
+    clone.fitness = fitness
+    return clone
+
+
 def frams_dissimilarity(
     frams_lib: types.FramsticksLibInterface, genotype_list: list[str], method: int
 ) -> np.ndarray:
@@ -136,14 +197,41 @@ def frams_dissimilarity(
         return np.zeros((len(genotype_list), len(genotype_list)))
 
 
+def frams_dissimilarity_between(
+    frams_lib: types.FramsticksLibInterface,
+    genotype_list1: list[str],
+    genotype_list2: list[str],
+    method: int,
+    raise_errors: bool = False,
+) -> np.ndarray:
+    # callers that keep the distances (see distances.DistanceMatrix) handle errors themselves,
+    # so that the zeros returned for a failed calculation are not kept
+    try:
+        return frams_lib.dissimilarityBetween(genotype_list1, genotype_list2, method)
+    except Exception as e:
+        if raise_errors:
+            raise
+        logging.error("Dissimilarity calculation failed: %s" % e)
+        return np.zeros((len(genotype_list1), len(genotype_list2)))
+
+
+def frams_budget_exhausted(frams_lib: types.FramsticksLibInterface) -> bool:
+    # FramsticksLibCompetition reports when the allowed time or number of evaluations is used up
+    is_budget_exhausted = getattr(frams_lib, "isBudgetExhausted", None)
+    return is_budget_exhausted is not None and is_budget_exhausted()
+
+
 def setup_toolbox(
-    frams_lib: types.FramsticksLibInterface, config: types.RunConfig
+    frams_lib: types.FramsticksLibInterface,
+    config: types.RunConfig,
+    screen: typing.Callable[[str], bool] | None = None,
 ) -> deap.base.Toolbox:
     deap.creator.create(
         "FitnessMax", deap.base.Fitness, weights=[1.0] * len(config.opt)
     )
-    deap.creator.create("Individual", list, fitness=deap.creator.FitnessMax)
+    deap.creator.create("Individual", GenotypeIndividual, __slots__=())
     toolbox = deap.base.Toolbox()
+    toolbox.register("clone", clone_individual)
     toolbox.register(
         "attr_simplest_genotype",
         frams_getsimplest,
@@ -159,21 +247,88 @@ def setup_toolbox(
         1,
     )
     toolbox.register("population", deap.tools.initRepeat, list, toolbox.individual)
-    toolbox.register("evaluate", frams_evaluate, frams_lib, config)
+    toolbox.register("evaluate", frams_evaluate, frams_lib, config, screen=screen)
+    toolbox.register("map", frams_map)
+    toolbox.register("stop", frams_budget_exhausted, frams_lib)
     toolbox.register("mate", frams_crossover, frams_lib)
     toolbox.register("mutate", frams_mutate, frams_lib)
     toolbox.register("select", deap.tools.selTournament, tournsize=config.tournament)
-    toolbox.register(
-        "dissimilarity",
-        frams_dissimilarity,
-        frams_lib,
-        method=config.dissimilarity_method,
-    )
+    if config.dissimilarity_method == sketch.SKETCH_METHOD:
+        sketcher = sketch.MinHashSketcher(num_perm=config.sketch_size)
+        toolbox.register("dissimilarity", sketcher.dissimilarity)
+        toolbox.register("dissimilarity_between", sketcher.dissimilarity_between)
+        if config.sketch_novelty_k > 0:
+            toolbox.register(
+                "reserve_fitness",
+                sketch.nearest_novelty,
+                sketcher,
+                config.sketch_novelty_k,
+            )
+        if config.sketch_exact_top_k > 0:
+            toolbox.register(
+                "exact_top_k",
+                sketch.exact_top_k,
+                functools.partial(
+                    frams_dissimilarity_between,
+                    frams_lib,
+                    method=config.sketch_exact_method,
+                ),
+                config.sketch_exact_top_k,
+                neighbours=config.sketch_novelty_k,
+            )
+    else:
+        toolbox.register(
+            "dissimilarity",
+            frams_dissimilarity,
+            frams_lib,
+            method=config.dissimilarity_method,
+        )
+        toolbox.register(
+            "dissimilarity_between",
+            frams_dissimilarity_between,
+            frams_lib,
+            method=config.dissimilarity_method,
+            raise_errors=True,
+        )
     if len(config.opt) > 1:
         toolbox.register("select", deap.tools.selNSGA2)
     return toolbox
 
 
+def setup_tiered_reserve_fitness(
+    frams_lib: types.FramsticksLibInterface, config: types.RunConfig
+) -> distances.TieredReserveFitness:
+    if config.dissimilarity_method == sketch.SKETCH_METHOD:
+        # the exact tier is computed by the Framsticks library, which has no sketch method
+        raise ValueError(
+            "-tiered_proxy_method needs an exact -dissimilarity_method, not %d"
+            % sketch.SKETCH_METHOD
+        )
+    if config.tiered_proxy_method == sketch.SKETCH_METHOD:
+        proxy = sketch.MinHashSketcher(
+            num_perm=config.sketch_size
+        ).dissimilarity_between
+    else:
+        proxy = functools.partial(
+            frams_dissimilarity_between,
+            frams_lib,
+            method=config.tiered_proxy_method,
+            raise_errors=True,
+        )
+    exact = functools.partial(
+        frams_dissimilarity_between,
+        frams_lib,
+        method=config.dissimilarity_method,
+        raise_errors=True,
+    )
+    return distances.TieredReserveFitness(
+        proxy,
+        exact,
+        exact_fraction=config.tiered_exact_fraction,
+        recalibration_period=config.tiered_recalibration,
+    )
+
+
 def setup_stats() -> deap.tools.Statistics:
     stats = deap.tools.Statistics(lambda ind: ind.fitness.values)
     stats.register("avg", np.mean)
@@ -0,0 +1,176 @@
+import logging
+import math
+import typing
+
+import numpy as np
+
+
+class DistanceMatrix:
+    """Dissimilarities between row genotypes and column genotypes, kept between calls.
+
+    DPGA compares reserve individuals (rows) with the main population (columns) several times
+    per generation, while both populations change only partly between generations. Only the
+    rows and columns of genotypes that were not seen before are computed, using
+    `dissimilarity_between(row_genotypes, column_genotypes)` (see defaults.frams_dissimilarity_between).
+    If it raises, `get` returns zeros for that call only, and nothing is kept, so the failed
+    distances are computed again in the next call.
+    """
+
+    def __init__(
+        self,
+        dissimilarity_between: typing.Callable[[list[str], list[str]], np.ndarray],
+    ) -> None:
+        self.dissimilarity_between = dissimilarity_between
+        self.rows = {}  # genotype -> row index in self.matrix
+        self.columns = {}  # genotype -> column index in self.matrix
+        self.matrix = np.zeros((0, 0))
+        self.computed = 0  # number of distances computed so far
+        self._rows_in_use = set()
+
+    def _compute(self, row_genotypes: list[str], column_genotypes: list[str]):
+        if not row_genotypes or not column_genotypes:
+            return np.zeros((len(row_genotypes), len(column_genotypes)))
+        block = np.asarray(self.dissimilarity_between(row_genotypes, column_genotypes))
+        self.computed += len(row_genotypes) * len(column_genotypes)
+        return block
+
+    def _update_columns(self, column_genotypes: list[str]) -> None:
+        columns = list(dict.fromkeys(column_genotypes))
+        if set(columns) == set(self.columns):
+            return
+        kept_columns = [g for g in columns if g in self.columns]
+        new_columns = [g for g in columns if g not in self.columns]
+        # rows not requested since the last change of columns are dropped instead of being
+        # extended with the new columns, otherwise the matrix would keep growing with old genotypes
+        rows = [g for g in self.rows if g in self._rows_in_use]
+        kept_block = self.matrix[
+            np.ix_(
+                [self.rows[g] for g in rows], [self.columns[g] for g in kept_columns]
+            )
+        ]
+        new_block = self._compute(rows, new_columns)
+        self.matrix = np.hstack([kept_block, new_block])
+        self.rows = {g: i for i, g in enumerate(rows)}
+        self.columns = {g: i for i, g in enumerate(kept_columns + new_columns)}
+        self._rows_in_use = set()
+
+    def _update_rows(self, row_genotypes: list[str]) -> None:
+        new_rows = [g for g in dict.fromkeys(row_genotypes) if g not in self.rows]
+        if not new_rows:
+            return
+        new_block = self._compute(new_rows, list(self.columns))
+        self.matrix = np.vstack([self.matrix, new_block])
+        for g in new_rows:
+            self.rows[g] = len(self.rows)
+
+    def get(self, row_genotypes: list[str], column_genotypes: list[str]) -> np.ndarray:
+        """Returns the len(row_genotypes) x len(column_genotypes) matrix of dissimilarities."""
+        try:
+            # both updates change the kept state only after their distances are computed
+            self._update_columns(column_genotypes)
+            self._update_rows(row_genotypes)
+        except Exception as e:
+            logging.error("Dissimilarity calculation failed: %s" % e)
+            return np.zeros((len(row_genotypes), len(column_genotypes)))
+        self._rows_in_use.update(row_genotypes)
+        return self.matrix[
+            np.ix_(
+                [self.rows[g] for g in row_genotypes],
+                [self.columns[g] for g in column_genotypes],
+            )
+        ]
+
+
+def _average_ranks(values: np.ndarray) -> np.ndarray:
+    # ranks with ties sharing their average rank, as in Spearman's rank correlation
+    order = np.argsort(values, kind="stable")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(len(values))
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    return (np.bincount(inverse, weights=ranks) / counts)[inverse]
+
+
+def rank_agreement(values1: np.ndarray, values2: np.ndarray) -> float:
+    """Spearman's rank correlation, NaN if it is undefined (fewer than 2 values or all equal)."""
+    if len(values1) < 2 or np.ptp(values1) == 0 or np.ptp(values2) == 0:
+        return float("nan")
+    return float(np.corrcoef(_average_ranks(values1), _average_ranks(values2))[0, 1])
+
+
+class TieredReserveFitness:
+    """DPGA reserve fitness (average distance to the main population) from a cheap proxy distance,
+    with only the extremes of the proxy ranking scored by the exact (e.g. phenetic) distance.
+
+    Every `recalibration_period` generations all reserve individuals are scored exactly once, and
+    a linear map from proxy to exact average distance is fitted, so that proxy-scored individuals
+    are comparable with exactly scored ones. The Spearman correlation of the proxy and exact ranking
+    measured then is reported by `collect` (e.g. `stats.register("proxy_agreement", tiered.collect)`).
+    Generations are counted by the calls: the main population changes once per generation of DPGA,
+    so a call with other main genotypes than the previous one starts a new generation.
+    """
+
+    def __init__(
+        self,
+        proxy_dissimilarity_between: typing.Callable[
+            [list[str], list[str]], np.ndarray
+        ],
+        exact_dissimilarity_between: typing.Callable[
+            [list[str], list[str]], np.ndarray
+        ],
+        exact_fraction: float = 0.2,
+        recalibration_period: int = 5,
+    ) -> None:
+        self.proxy = DistanceMatrix(proxy_dissimilarity_between)
+        self.exact = DistanceMatrix(exact_dissimilarity_between)
+        # fraction of reserve individuals scored exactly, half from the top and half from the bottom of the proxy ranking
+        self.exact_fraction = exact_fraction
+        self.recalibration_period = recalibration_period
+        self.slope = 1.0
+        self.intercept = 0.0
+        self.agreement = float("nan")
+        self._generations_since_calibration = None  # None until the first calibration
+        self._main_genotypes = None  # of the previous call
+
+    def _calibrate(self, proxy: np.ndarray, exact: np.ndarray) -> None:
+        self.agreement = rank_agreement(proxy, exact)
+        if len(proxy) >= 2 and np.ptp(proxy) > 0:
+            self.slope, self.intercept = np.polyfit(proxy, exact, 1)
+        self._generations_since_calibration = 0
+
+    def __call__(
+        self, reserve_genotypes: list[str], main_genotypes: list[str]
+    ) -> list[float]:
+        if not reserve_genotypes:
+            return []
+        main_key = tuple(main_genotypes)
+        if main_key != self._main_genotypes:
+            self._main_genotypes = main_key
+            if self._generations_since_calibration is not None:
+                self._generations_since_calibration += 1
+        proxy = self.proxy.get(reserve_genotypes, main_genotypes).mean(axis=1)
+        if (
+            self._generations_since_calibration is None
+            or self._generations_since_calibration >= self.recalibration_period
+        ):
+            if self._generations_since_calibration is None:
+                # the initial population is scored before generation 1, which starts with the
+                # same main population
+                self._main_genotypes = None
+            exact = self.exact.get(reserve_genotypes, main_genotypes).mean(axis=1)
+            self._calibrate(proxy, exact)
+            return [float(value) for value in exact]
+
+        fitness = self.slope * proxy + self.intercept
+        per_side = math.ceil(self.exact_fraction * len(reserve_genotypes) / 2)
+        order = np.argsort(-proxy, kind="stable")
+        if 2 * per_side >= len(order):
+            extremes = order
+        else:
+            extremes = np.concatenate([order[:per_side], order[-per_side:]])
+        fitness[extremes] = self.exact.get(
+            [reserve_genotypes[i] for i in extremes], main_genotypes
+        ).mean(axis=1)
+        return [float(value) for value in fitness]
+
+    def collect(self, _pop_fitnesses: typing.Any = None) -> float:
+        return self.agreement
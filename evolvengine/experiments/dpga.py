@@ -1,15 +1,18 @@
 import random
-from copy import deepcopy
 import dataclasses
 import json
 import time
 
-import deap.algorithms
 import deap.tools as tools
 import numpy as np
 
+from .. import checkpoint as checkpoint_module
+from .. import distances as distances_module
+from .. import timing
+from .. import variation
 
-def fitness_reserve(reserve_population, main_population, toolbox):
+
+def fitness_reserve(reserve_population, main_population, toolbox, distances=None):
     """
     Fitness Function for Reserve Population.
     An individual in the reserve population is given a high fitness
@@ -19,16 +22,37 @@ def fitness_reserve(reserve_population, main_population, toolbox):
     :param reserve_population: list of individuals in the reserve population
     :param main_population: list of individuals in the main population
     :param toolbox: toolbox used for the evolution
+    :param distances: DistanceMatrix that keeps reserve x main distances between calls, so that only
+        pairs with new genotypes are computed
     :return: list of fitness values for each individual in the reserve population
     """
-    fitnesses = []
     main_pop_to_compare = [main_ind[0] for main_ind in main_population]
-    for res_ind in reserve_population:
-
-        distances = toolbox.dissimilarity(res_ind + main_pop_to_compare)[0, 1:]
-        avg_dist_main = np.mean(distances)
-        fitnesses.append([avg_dist_main])
+    reserve_pop_to_compare = [res_ind[0] for res_ind in reserve_population]
+    # tiered mode: ranked by a cheap proxy distance, only the extremes scored exactly;
+    # sketch novelty: distance to the nearest main individuals (see sketch.nearest_novelty)
+    reserve_fitness = getattr(toolbox, "reserve_fitness", None)
+    if reserve_fitness is not None:
+        fitnesses = [
+            [fitness]
+            for fitness in reserve_fitness(reserve_pop_to_compare, main_pop_to_compare)
+        ]
+    else:
+        if distances is None:
+            distances = distances_module.DistanceMatrix(toolbox.dissimilarity_between)
+        fitnesses = []
+        reserve_to_main = distances.get(reserve_pop_to_compare, main_pop_to_compare)
+        for distances_to_main in reserve_to_main:
+            avg_dist_main = np.mean(distances_to_main)
+            fitnesses.append([avg_dist_main])
 
+    # with approximate (sketch) distances, the most diverse individuals can be re-ranked exactly
+    exact_top_k = getattr(toolbox, "exact_top_k", None)
+    if exact_top_k is not None:
+        fitnesses = exact_top_k(
+            reserve_pop_to_compare,
+            main_pop_to_compare,
+            fitnesses,
+        )
     return fitnesses
 
 
@@ -40,21 +64,28 @@ def evaluate_main_population(
         invalid_ind = main_population
     else:
         invalid_ind = [ind for ind in main_population if not ind.fitness.valid]
-    fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
-    for ind, fit in zip(invalid_ind, fitnesses):
-        ind.fitness.values = fit
-    return main_population, len(invalid_ind)
+    # individuals with the same genotype are evaluated once
+    same_genotype = {}
+    for ind in invalid_ind:
+        same_genotype.setdefault(ind[0], []).append(ind)
+    fitnesses = toolbox.map(
+        toolbox.evaluate, [inds[0] for inds in same_genotype.values()]
+    )
+    for inds, fit in zip(same_genotype.values(), fitnesses):
+        for ind in inds:
+            ind.fitness.values = fit
+    return main_population, len(same_genotype)
 
 
 def evaluate_reserve_population(
-    main_population, reserve_population, toolbox, all: bool = False
+    main_population, reserve_population, toolbox, all: bool = False, distances=None
 ) -> list:
     # RESERVE POPULATION: Evaluate the individuals
     if all:
         invalid_ind = reserve_population
     else:
         invalid_ind = [ind for ind in reserve_population if not ind.fitness.valid]
-    fitnesses = fitness_reserve(invalid_ind, main_population, toolbox)
+    fitnesses = fitness_reserve(invalid_ind, main_population, toolbox, distances)
     for ind, fit in zip(invalid_ind, fitnesses):
         ind.fitness.values = fit
     return reserve_population
@@ -62,9 +93,7 @@ def evaluate_reserve_population(
 
 def save_partial_results(config, hof, log, time_taken, gen):
     print("Saving DPGA output at generation %d to '%s'" % (gen, config.out))
-    hof_instances = [
-        {"genotype": ind[0], "fitness": ind.fitness.values} for ind in hof
-    ]
+    hof_instances = [{"genotype": ind[0], "fitness": ind.fitness.values} for ind in hof]
     result = {
         "hof": hof_instances,
         "log": log,
@@ -87,42 +116,76 @@ def dpga(
     verbose=__debug__,
     config=None,
     save_period=5,
+    migrate=None,
 ):
     time_start = time.perf_counter()
     # in the paper: main population = 100, reserve population = 200
-    reserve_pop = 0.6
+    reserve_pop = config.reserve_ratio if config is not None else 0.6
     n = round(reserve_pop * len(population))  # reserve population size
     m = len(population) - n  # main population size
 
-    logbook = tools.Logbook()
-    logbook.header = ["gen", "nevals"] + (stats.fields if stats else [])
+    # reserve x main distances, updated only for genotypes that change between generations
+    distances = distances_module.DistanceMatrix(toolbox.dissimilarity_between)
 
-    # Divide the population into two groups: the main population and the reserve population
-    main_population = population[:m]
-    reserve_population = population[m:]
+    # the state is saved with toolbox.checkpoint and restored from toolbox.resume (see checkpoint.py),
+    # and each generation is saved with toolbox.results (see results.py)
+    checkpoint = getattr(toolbox, "checkpoint", None)
+    results = getattr(toolbox, "results", None)
+    resume = getattr(toolbox, "resume", None)
+    resumed = resume() if resume is not None else None
 
-    main_population, evaluated = evaluate_main_population(main_population, toolbox)
-    reserve_population = evaluate_reserve_population(
-        main_population, reserve_population, toolbox
-    )
+    def end_generation(gen):
+        state = {
+            "main_population": main_population,
+            "reserve_population": reserve_population,
+            "halloffame": halloffame,
+            "logbook": logbook,
+        }
+        for sink in (checkpoint, results):
+            if sink is not None:
+                sink(gen, state)
+
+    if resumed is None:
+        logbook = tools.Logbook()
+        logbook.header = ["gen", "nevals"] + (stats.fields if stats else [])
 
-    # STATS AND HALLOFFAME
-    if halloffame is not None:
-        halloffame.update(main_population)
+        # Divide the population into two groups: the main population and the reserve population
+        main_population = population[:m]
+        reserve_population = population[m:]
 
-    record = stats.compile(main_population) if stats else {}
-    logbook.record(gen=0, nevals=evaluated, **record)
-    if verbose:
-        print(logbook.stream)
+        main_population, evaluated = evaluate_main_population(main_population, toolbox)
+        reserve_population = evaluate_reserve_population(
+            main_population, reserve_population, toolbox, distances=distances
+        )
+
+        # STATS AND HALLOFFAME
+        if halloffame is not None:
+            halloffame.update(main_population)
+
+        record = stats.compile(main_population) if stats else {}
+        logbook.record(gen=0, nevals=evaluated, **record)
+        if verbose:
+            print(logbook.stream)
+        start_gen = 0
+        end_generation(0)
+    else:
+        start_gen, state = resumed
+        main_population = state["main_population"]
+        reserve_population = state["reserve_population"]
+        logbook = state["logbook"]
+        checkpoint_module.restore_halloffame(halloffame, state["halloffame"])
 
     # Begin the generational process
-    for gen in range(1, ngen + 1):
+    for gen in range(start_gen + 1, ngen + 1):
+        if toolbox.stop():
+            print("Stopping DPGA before generation %d" % gen)
+            break
 
         # MAIN POPULATION
         # Select the next generation individuals
         main_offspring = toolbox.select(main_population, m)
         # Vary the pool of individuals
-        main_offspring = deap.algorithms.varAnd(main_offspring, toolbox, cxpb, mutpb)
+        main_offspring = variation.var_and(main_offspring, toolbox, cxpb, mutpb)
         # Evaluate the individuals with an invalid fitness
         main_offspring, evaluated1 = evaluate_main_population(main_offspring, toolbox)
 
@@ -130,12 +193,13 @@ def dpga(
         # Select the next generation individuals
         reserve_offspring = toolbox.select(reserve_population, n)
         # Vary the pool of individuals
-        reserve_offspring = deap.algorithms.varAnd(
-            reserve_offspring, toolbox, cxpb, mutpb
+        # (reserve fitness is a distance, not a simulation, so it is not reported as saved)
+        reserve_offspring = variation.var_and(
+            reserve_offspring, toolbox, cxpb, mutpb, report_unchanged=False
         )
         # Evaluate the individuals with an invalid fitness
         reserve_offspring = evaluate_reserve_population(
-            main_population, reserve_offspring, toolbox
+            main_population, reserve_offspring, toolbox, distances=distances
         )
 
         # CROSS BREEDING
@@ -143,24 +207,39 @@ def dpga(
         cross_main_offspring = toolbox.select(main_population, (n - m) // 2)
         cross_reserve_offspring = toolbox.select(reserve_population, (n - m) // 2)
         cross_all_offspring = cross_main_offspring + cross_reserve_offspring
+        # Island model: individuals from other islands take part in cross breeding
+        if migrate is not None:
+            cross_all_offspring += migrate(gen, main_population, reserve_population)
         # Shuffle the offspring
         random.shuffle(cross_all_offspring)
-        cross_all_offspring = deap.algorithms.varAnd(
-            cross_all_offspring, toolbox, cxpb, mutpb
+        # (their fitness is settled during survival selection below)
+        cross_all_offspring = variation.var_and(
+            cross_all_offspring, toolbox, cxpb, mutpb, report_unchanged=False
         )
 
         # SURVIVAL SELECTION FOR BOTH POPULATIONS
-        main_offspring += deepcopy(cross_all_offspring)
-        reserve_offspring += deepcopy(cross_all_offspring)
+        # Cross-bred offspring may come from either population, so their fitness may be of the wrong kind.
+        # Main fitness is carried over for genotypes already evaluated in the main population and its
+        # offspring, only new genotypes are simulated. Reserve fitness depends on the current main
+        # population, so it is recomputed for all reserve individuals, but from cached distances.
+        main_fitness = {
+            ind[0]: ind.fitness.values for ind in main_population + main_offspring
+        }
+        cross_main_offspring = [toolbox.clone(ind) for ind in cross_all_offspring]
+        for ind in cross_main_offspring:
+            if ind[0] in main_fitness:
+                ind.fitness.values = main_fitness[ind[0]]
+            else:
+                del ind.fitness.values
+        main_offspring += cross_main_offspring
+        reserve_offspring += [toolbox.clone(ind) for ind in cross_all_offspring]
 
-        main_offspring, evaluated2 = evaluate_main_population(
-            main_offspring, toolbox, all=True
-        )
+        main_offspring, evaluated2 = evaluate_main_population(main_offspring, toolbox)
         main_offspring.sort(key=lambda x: x.fitness.values[0], reverse=True)
         main_offspring = main_offspring[:m]
 
         reserve_offspring = evaluate_reserve_population(
-            main_population, reserve_offspring, toolbox, all=True
+            main_population, reserve_offspring, toolbox, all=True, distances=distances
         )
         reserve_offspring.sort(key=lambda x: x.fitness.values[0], reverse=True)
         reserve_offspring = reserve_offspring[:n]
@@ -179,9 +258,11 @@ def dpga(
         if verbose:
             print(logbook.stream)
 
-        # Save partial results
+        # Save partial results (unless every generation is already saved to the results stream)
         time_taken = time.perf_counter() - time_start
-        if gen % save_period == 0:
-            save_partial_results(config, halloffame, logbook, time_taken, gen)
+        if gen % save_period == 0 and results is None:
+            with timing.phase(toolbox, "io"):
+                save_partial_results(config, halloffame, logbook, time_taken, gen)
+        end_generation(gen)
 
     return main_population, logbook
@@ -0,0 +1,265 @@
+import dataclasses
+import json
+import multiprocessing as mp
+import queue
+import signal
+import time
+import typing
+
+import deap.base
+import deap.creator
+import deap.tools
+import numpy as np
+
+from . import results as results_module
+from . import timing
+from . import types
+from .experiments.dpga import dpga
+
+# builds (lib, cache, toolbox, stats) for a run, and closes them without ending the library,
+# returning what the parent needs to end it for all islands (see frams_evolve.py)
+SetupEvolution = typing.Callable[[types.RunConfig], tuple]
+FinishEvolution = typing.Callable[..., typing.Any]
+
+# logbook columns that count events, so they are summed over islands; other columns are averaged
+_SUMMED_COLUMNS = {
+    "nevals",
+    "nsaved",
+    "screened",
+    "cache_hits",
+    "cache_misses",
+    "cache_f0_hits",
+}
+
+
+class RingMigration:
+    """Every `interval` generations, sends copies of the best main and reserve individuals of an
+    island to the next island, and returns the individuals that arrived from the previous one.
+
+    Migration does not wait for other islands (which may be slower, or may have already used up
+    their evaluation budget), so which generation the immigrants arrive in depends on timing.
+    """
+
+    def __init__(
+        self,
+        inbox: mp.Queue,
+        outbox: mp.Queue,
+        interval: int,
+        migrants: int,
+    ) -> None:
+        self.inbox = inbox
+        self.outbox = outbox
+        self.interval = interval
+        self.migrants = migrants
+
+    def _best(self, population: list[types.Individual]) -> list[str]:
+        best = sorted(population, key=lambda ind: ind.fitness.values, reverse=True)
+        return [ind[0] for ind in best[: self.migrants]]
+
+    def __call__(
+        self,
+        gen: int,
+        main_population: list[types.Individual],
+        reserve_population: list[types.Individual],
+    ) -> list[types.Individual]:
+        if gen % self.interval != 0:
+            return []
+        self.outbox.put(self._best(main_population) + self._best(reserve_population))
+        immigrants = []
+        while True:
+            try:
+                immigrants += self.inbox.get_nowait()
+            except queue.Empty:
+                break
+        # only genotypes travel, fitness is settled by the receiving island
+        return [deap.creator.Individual([genotype]) for genotype in immigrants]
+
+
+def _run_island(
+    config: types.RunConfig,
+    island: int,
+    setup: SetupEvolution,
+    finish: FinishEvolution,
+    inbox: mp.Queue,
+    outbox: mp.Queue,
+    results: mp.Queue,
+) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # the next island may finish first and stop reading its inbox; migrants still buffered then
+    # are dropped, instead of this process waiting for them to be read before it can exit
+    outbox.cancel_join_thread()
+    lib, cache, toolbox, stats = setup(config)
+    stream = None
+    if config.stream_results:
+        stream = results_module.ResultsStream(
+            config.out, dataclasses.asdict(config), append=config.resume is not None
+        )
+        toolbox.register("results", stream)
+    hof = deap.tools.HallOfFame(config.hof_size)
+    timer = timing.PhaseTimer() if config.timing else None
+    if timer is not None:
+        timer.instrument(toolbox, stats, hof)
+    migration = RingMigration(inbox, outbox, config.migration_interval, config.migrants)
+    population = toolbox.population(n=config.popsize)
+    time_start = time.perf_counter()
+    _, log = dpga(
+        population,
+        toolbox,
+        cxpb=config.pxov,
+        mutpb=config.pmut,
+        ngen=config.generations,
+        stats=stats,
+        halloffame=hof,
+        verbose=island == 0,
+        config=config,
+        save_period=5,
+        migrate=migration,
+    )
+    hof_instances = [(ind[0], ind.fitness.values) for ind in hof]
+    if stream is not None:
+        stream.finish(
+            [
+                {"genotype": genotype, "fitness": fitness}
+                for genotype, fitness in hof_instances
+            ],
+            time.perf_counter() - time_start,
+        )
+    if timer is not None:
+        print("Island %d: %s" % (island, timer.summary()))
+    summary = finish(lib, cache, end=False)
+    results.put((island, hof_instances, [dict(record) for record in log], summary))
+
+
+def _merge_records(records: list[dict]) -> dict:
+    # values may be arrays (one per criterion) for multi-criteria statistics
+    merged = {}
+    for column in records[0]:
+        values = np.array([record[column] for record in records if column in record])
+        if column == "gen":
+            merged[column] = int(values[0])
+        elif column in _SUMMED_COLUMNS:
+            merged[column] = values.sum(axis=0)
+        elif column == "min":
+            merged[column] = values.min(axis=0)
+        elif column == "max":
+            merged[column] = values.max(axis=0)
+        elif column == "stddev" and "avg" in records[0]:
+            # pooled over the (equally sized) main populations of the islands
+            avgs = np.array([record["avg"] for record in records])
+            variance = np.mean(values**2 + avgs**2, axis=0) - avgs.mean(axis=0) ** 2
+            merged[column] = np.sqrt(np.maximum(variance, 0.0))
+        else:
+            merged[column] = values.mean(axis=0)
+        # plain Python numbers, so that they are saved as numbers and not strings
+        merged[column] = np.asarray(merged[column]).tolist()
+    return merged
+
+
+def merge_logbooks(logs: list[list[dict]]) -> deap.tools.Logbook:
+    # islands may stop in different generations (e.g. when their budget is exhausted)
+    logbook = deap.tools.Logbook()
+    for gen in sorted({record["gen"] for log in logs for record in log}):
+        logbook.record(
+            **_merge_records(
+                [record for log in logs for record in log if record["gen"] == gen]
+            )
+        )
+    return logbook
+
+
+def merge_hofs(
+    hofs: list[list[tuple[str, tuple[float, ...]]]], hof_size: int
+) -> list[dict]:
+    best = {}
+    for genotype, fitness in sorted(
+        (entry for hof in hofs for entry in hof),
+        key=lambda entry: entry[1],
+        reverse=True,
+    ):
+        best.setdefault(genotype, fitness)
+    return [
+        {"genotype": genotype, "fitness": fitness}
+        for genotype, fitness in list(best.items())[:hof_size]
+    ]
+
+
+def _island_path(path: str | None, island: int) -> str | None:
+    return None if path is None else "%s.island%d" % (path, island)
+
+
+def run_islands(
+    config: types.RunConfig, setup: SetupEvolution, finish: FinishEvolution
+) -> list:
+    """Runs `config.islands` DPGA islands in separate processes, connected in a ring, and saves
+    their merged hall of fame and logbook to `config.out` (and the logbook of each island).
+
+    Each island calls `finish(lib, cache, end=False)` when it is done, and the values it returns
+    (e.g. the budget state of FramsticksLibCompetition) are returned in the order of islands,
+    so that the caller can end the library once for all of them.
+    """
+    if config.meta != types.MetaAlgorithm.DPGA:
+        raise ValueError("Islands are only supported for DPGA, not %s" % config.meta)
+    context = mp.get_context("spawn")
+    inboxes = [context.Queue() for _ in range(config.islands)]
+    results = context.Queue()
+    processes = []
+    time_start = time.perf_counter()
+    for island in range(config.islands):
+        island_config = dataclasses.replace(
+            config,
+            seed=config.seed + island,
+            out=_island_path(config.out, island),
+            checkpoint_file=_island_path(config.checkpoint_file, island),
+            resume=_island_path(config.resume, island),
+            trace_file=_island_path(config.trace_file, island),
+        )
+        process = context.Process(
+            target=_run_island,
+            args=(
+                island_config,
+                island,
+                setup,
+                finish,
+                inboxes[island],
+                inboxes[(island + 1) % config.islands],
+                results,
+            ),
+        )
+        process.start()
+        processes.append(process)
+
+    island_results = {}
+    while len(island_results) < config.islands:
+        try:
+            island, hof, log, summary = results.get(timeout=5)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                raise RuntimeError("Island processes ended without sending results")
+            continue
+        island_results[island] = (hof, log, summary)
+    # migrants that were sent to islands which had already finished
+    for inbox in inboxes:
+        while True:
+            try:
+                inbox.get_nowait()
+            except queue.Empty:
+                break
+    for process in processes:
+        process.join()
+    time_taken = time.perf_counter() - time_start
+
+    logs = [island_results[island][1] for island in range(config.islands)]
+    print("Saving output to '%s'" % config.out)
+    result = {
+        "hof": merge_hofs(
+            [island_results[island][0] for island in range(config.islands)],
+            config.hof_size,
+        ),
+        "log": merge_logbooks(logs),
+        "island_logs": logs,
+        "args": dataclasses.asdict(config),
+        "time_s": time_taken,
+    }
+    with open(config.out, "w") as outfile:
+        json.dump(result, outfile, default=str)
+    return [island_results[island][2] for island in range(config.islands)]
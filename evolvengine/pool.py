@@ -0,0 +1,102 @@
+import math
+import multiprocessing as mp
+import os
+import signal
+import time
+import typing
+
+_worker_lib = None  # the FramsticksLib instance owned by the current worker process
+
+
+def _initialize_worker(
+    lib_class: type,
+    frams_path: str,
+    frams_lib_name: str | None,
+    sim_settings_files: str | None,
+    deterministic: bool,
+) -> None:
+    global _worker_lib
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    lib_class.DETERMINISTIC = deterministic
+    _worker_lib = lib_class(frams_path, frams_lib_name, sim_settings_files)
+
+
+def _evaluate_chunk(genotype_list: list[str]) -> tuple[int, float, list[dict]]:
+    time_start = time.perf_counter()
+    results = _worker_lib.evaluate(genotype_list)
+    return os.getpid(), time.perf_counter() - time_start, results
+
+
+def _dissimilarity_pairs(
+    genotype_list: list[str], method: int, pairs: list[tuple[int, int]]
+) -> list[float]:
+    # the main process has already looked the pairs up in its cache
+    return _worker_lib.dissimilarityPairs(genotype_list, method, pairs, use_cache=False)
+
+
+class FramsticksPool:
+    """Pool of worker processes, each running its own Framsticks library instance.
+
+    The frams module keeps global state, so parallel evaluation needs separate processes,
+    each calling frams.init() on its own (see frams.py). Attach the pool to the main
+    FramsticksLib (`lib.pool = pool`): its evaluate() will spread every batch over the workers,
+    and its dissimilarity() will do the same with pairs of genotypes to compare phenetically.
+    """
+
+    def __init__(
+        self,
+        lib_class: type,
+        frams_path: str,
+        frams_lib_name: str | None,
+        sim_settings_files: str | None,
+        processes: int,
+    ) -> None:
+        self.processes = processes
+        self.evaluation_time = {}  # worker process id -> total time spent evaluating
+        # "spawn" so that workers do not inherit the parent's already initialized frams library
+        self._pool = mp.get_context("spawn").Pool(
+            processes,
+            _initialize_worker,
+            (
+                lib_class,
+                frams_path,
+                frams_lib_name,
+                sim_settings_files,
+                lib_class.DETERMINISTIC,
+            ),
+        )
+
+    def _split(self, items: list) -> list[list]:
+        # contiguous chunks, one per worker, so each worker pays the simulator setup once per batch
+        chunk_size = max(1, math.ceil(len(items) / self.processes))
+        return [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    def evaluate(self, genotype_list: list[str]) -> list[dict]:
+        chunks = self._split(genotype_list)
+        results = []
+        # Pool.map preserves the order of chunks
+        for pid, elapsed, chunk_results in self._pool.map(_evaluate_chunk, chunks):
+            self.evaluation_time[pid] = self.evaluation_time.get(pid, 0.0) + elapsed
+            results.extend(chunk_results)
+        return results
+
+    def dissimilarityPairs(
+        self, genotype_list: list[str], method: int, pairs: list[tuple[int, int]]
+    ) -> list[float]:
+        chunks = self._split(pairs)
+        distances = []
+        for chunk_distances in self._pool.starmap(
+            _dissimilarity_pairs, [(genotype_list, method, chunk) for chunk in chunks]
+        ):
+            distances.extend(chunk_distances)
+        return distances
+
+    def close(self) -> None:
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self) -> "FramsticksPool":
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
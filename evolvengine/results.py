@@ -0,0 +1,134 @@
+import json
+import queue
+import threading
+import time
+import typing
+
+import deap.tools
+
+
+class ResultsStream:
+    """Saves the results of a run while it goes on, as JSON lines appended to a file, instead of one
+    JSON document rewritten from scratch (see EvolutionRunner and dpga.save_partial_results).
+
+    Registered as `toolbox.results`, it is called by the algorithms after every generation, and
+    `finish` is called at the end of the run. The file has one record per line:
+    - {"type": "args", "args": {...}}, the configuration of the run,
+    - {"type": "gen", "gen": ..., "time_s": ..., "record": {...}, "hof_added": [...], "hof_removed": [...]}
+      for every generation: its logbook record and the changes of the hall of fame since the previous
+      generation ({"genotype": ..., "fitness": [...]} entries added, genotypes removed); the first
+      generation written by a stream has the whole hall of fame in "hof" instead,
+    - {"type": "summary", "time_s": ..., "hof": [...]} when the run has finished.
+    Lines are written by a background thread, so the generational loop does not wait for the disk,
+    and a crashed run keeps all the generations written before the crash (see load_results).
+    A run resumed from a checkpoint appends to the file of the interrupted run; generations that are
+    repeated after resuming replace the ones written before.
+    """
+
+    def __init__(self, path: str, args: dict, append: bool = False) -> None:
+        self.path = path
+        self._hof = (
+            None  # genotype -> fitness in the hall of fame of the last generation
+        )
+        self._time_start = time.perf_counter()
+        self._queue = queue.Queue()
+        self._file = open(path, "a" if append else "w")
+        self._thread = threading.Thread(target=self._write_records, daemon=True)
+        self._thread.start()
+        self._queue.put({"type": "args", "args": args})
+
+    def _write_records(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            self._file.write(json.dumps(record, default=str) + "\n")
+            if self._queue.empty():
+                self._file.flush()
+        self._file.close()
+
+    def __call__(self, gen: int, state: dict) -> None:
+        halloffame = state.get("halloffame")
+        hof = {} if halloffame is None else _hof_fitnesses(halloffame)
+        record = {
+            "type": "gen",
+            "gen": gen,
+            "time_s": time.perf_counter() - self._time_start,
+            "record": dict(state["logbook"][-1]),
+        }
+        if self._hof is None:
+            record["hof"] = _hof_instances(hof)
+        else:
+            record["hof_added"] = _hof_instances(
+                {g: f for g, f in hof.items() if self._hof.get(g) != f}
+            )
+            record["hof_removed"] = [g for g in self._hof if g not in hof]
+        self._queue.put(record)
+        self._hof = hof
+
+    def finish(self, hof_instances: list[dict], time_taken: float) -> None:
+        self._queue.put({"type": "summary", "time_s": time_taken, "hof": hof_instances})
+        self.close()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+
+def _hof_fitnesses(halloffame: deap.tools.HallOfFame) -> dict[str, list[float]]:
+    return {ind[0]: list(ind.fitness.values) for ind in halloffame}
+
+
+def _hof_instances(hof: dict[str, list[float]]) -> list[dict]:
+    return [
+        {"genotype": genotype, "fitness": fitness} for genotype, fitness in hof.items()
+    ]
+
+
+def _load_stream(lines: list[str]) -> dict[str, typing.Any]:
+    results = {"args": None, "log": [], "hof": [], "time_s": 0.0, "finished": False}
+    hof = {}
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # the last line of a run that crashed while writing it
+            break
+        if record["type"] == "args":
+            results["args"] = record["args"]
+        elif record["type"] == "gen":
+            if results["log"] and results["log"][-1]["gen"] >= record["gen"]:
+                # resumed from a checkpoint, generations since the checkpoint are repeated
+                results["log"] = [r for r in results["log"] if r["gen"] < record["gen"]]
+            results["log"].append(record["record"])
+            results["time_s"] = record["time_s"]
+            if "hof" in record:
+                hof = {}
+            for genotype in record.get("hof_removed", []):
+                del hof[genotype]
+            for ind in record.get("hof", []) + record.get("hof_added", []):
+                hof[ind["genotype"]] = ind["fitness"]
+        elif record["type"] == "summary":
+            results["time_s"] = record["time_s"]
+            results["hof"] = record["hof"]
+            results["finished"] = True
+    if not results["finished"]:
+        results["hof"] = _hof_instances(
+            dict(sorted(hof.items(), key=lambda item: item[1], reverse=True))
+        )
+    return results
+
+
+def load_results(path: str) -> dict[str, typing.Any]:
+    """Reads the results of a run saved by ResultsStream or as one JSON document, as a dictionary
+    with (at least) "args", "log", "hof" and "time_s"."""
+    with open(path, "r") as infile:
+        text = infile.read()
+    first_line = text.split("\n", 1)[0]
+    try:
+        first_record = json.loads(first_line)
+    except json.JSONDecodeError:
+        first_record = None
+    if isinstance(first_record, dict) and first_record.get("type") == "args":
+        return _load_stream(text.splitlines())
+    return json.loads(text)
@@ -6,7 +6,7 @@ import deap.base
 import deap.algorithms
 import deap.tools
 
-from . import types, algorithms
+from . import types, algorithms, results, timing
 
 
 class EvolutionRunner:
@@ -22,6 +22,17 @@ class EvolutionRunner:
         self.stats = stats
 
     def run(self) -> None:
+        stream = None
+        if self.config.stream_results:
+            stream = results.ResultsStream(
+                self.config.out,
+                dataclasses.asdict(self.config),
+                append=self.config.resume is not None,
+            )
+            self.toolbox.register("results", stream)
+        timer = timing.PhaseTimer() if self.config.timing else None
+        if timer is not None:
+            timer.instrument(self.toolbox, self.stats, self.hof)
         pop = self.toolbox.population(n=self.config.popsize)
         time_start = time.perf_counter()
         algorithm = algorithms.resolve_algorithm(self.config)
@@ -41,11 +52,17 @@ class EvolutionRunner:
         hof_instances = [
             {"genotype": ind[0], "fitness": ind.fitness.values} for ind in self.hof
         ]
-        result = {
-            "hof": hof_instances,
-            "log": log,
-            "args": dataclasses.asdict(self.config),
-            "time_s": time_taken,
-        }
-        with open(self.config.out, "w") as outfile:
-            json.dump(result, outfile, default=str)
+        with timing.phase(self.toolbox, "io"):
+            if stream is not None:
+                stream.finish(hof_instances, time_taken)
+            else:
+                result = {
+                    "hof": hof_instances,
+                    "log": log,
+                    "args": dataclasses.asdict(self.config),
+                    "time_s": time_taken,
+                }
+                with open(self.config.out, "w") as outfile:
+                    json.dump(result, outfile, default=str)
+        if timer is not None:
+            print(timer.summary())
@@ -0,0 +1,60 @@
+from . import cache as cache_module
+from . import counters, types
+
+
+class ConstraintScreen:
+    """Rejects genotypes that violate RunConfig's max_* constraints before they are simulated.
+
+    The genotype length is checked first, then the model is built (without simulation) to count
+    its parts, joints, neurons and connections, as in FramsticksLib.satisfiesConstraints().
+    Calling the screen returns True for genotypes that should be simulated. With a `cache`, a
+    genotype would only have been simulated once, and not at all if its evaluation is already
+    cached, so only the first rejection of genotypes missing from the cache is counted.
+    """
+
+    def __init__(
+        self,
+        lib: types.FramsticksLibInterface,
+        config: types.RunConfig,
+        cache: cache_module.EvaluationCache | None = None,
+    ) -> None:
+        self.lib = lib
+        self.cache = cache
+        self.max_numgenochars = config.max_numgenochars
+        self.max_pjnc = (
+            config.max_numparts,
+            config.max_numjoints,
+            config.max_numneurons,
+            config.max_numconnections,
+        )
+        self.rejected = counters.Counter()  # simulations avoided
+        self._rejected_keys = set()  # cache keys of the counted rejections
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_numgenochars is not None or any(
+            limit is not None for limit in self.max_pjnc
+        )
+
+    def __call__(self, genotype: str) -> bool:
+        if self.max_numgenochars is not None and len(genotype) > self.max_numgenochars:
+            return self._reject(genotype)
+        if all(limit is None for limit in self.max_pjnc):
+            return True
+        pjnc = self.lib.getPJNC(genotype)
+        if pjnc is None or any(
+            limit is not None and value > limit
+            for value, limit in zip(pjnc, self.max_pjnc)
+        ):  # a genotype whose model cannot be built would fail in the simulation anyway
+            return self._reject(genotype)
+        return True
+
+    def _reject(self, genotype: str) -> bool:
+        if self.cache is None:
+            self.rejected.add()
+            return False
+        key = self.cache.key(genotype)
+        if key not in self._rejected_keys and genotype not in self.cache:
+            self._rejected_keys.add(key)
+            self.rejected.add()
+        return False
@@ -0,0 +1,166 @@
+import collections
+import typing
+import zlib
+
+import numpy as np
+
+# dissimilarity method id (see -dissimilarity_method) of the approximate MinHash distance; the
+# Framsticks methods are 0, 1, 2 (phenetic), -1 (Levenshtein), -2, -3 (density distribution)
+SKETCH_METHOD = -4
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = (1 << 32) - 1
+
+
+class MinHashSketcher:
+    """Approximate genotype dissimilarity for large populations and archives.
+
+    Each genotype is summarized by a fixed-size MinHash sketch of its character n-grams, and the
+    dissimilarity of two genotypes is the estimated Jaccard distance (0..1) of their n-gram sets,
+    i.e. the fraction of sketch positions that differ. Comparing sketches costs the same for
+    every pair of genotypes, no matter how long they are, and is vectorized over whole populations.
+    Sketches are remembered per genotype (LRU), so survivors are not sketched again.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = 64,
+        ngram: int = 3,
+        seed: int = 1,
+        maxsize: int = 100_000,
+    ) -> None:
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.maxsize = maxsize
+        # universal hashing h(x) = (a*x + b) mod p applied to 32-bit n-gram hashes, as in datasketch
+        generator = np.random.default_rng(seed)
+        self._a = generator.integers(1, _MAX_HASH, num_perm, dtype=np.uint64)
+        self._b = generator.integers(0, _MAX_HASH, num_perm, dtype=np.uint64)
+        self._sketches = collections.OrderedDict()
+
+    def _ngrams(self, genotype: str) -> set[str]:
+        if len(genotype) <= self.ngram:
+            return {genotype}
+        return {
+            genotype[i : i + self.ngram] for i in range(len(genotype) - self.ngram + 1)
+        }
+
+    def _sketch(self, genotype: str) -> np.ndarray:
+        # crc32 and not hash(), which differs between interpreter runs and would make runs irreproducible
+        hashes = np.array(
+            [zlib.crc32(ngram.encode()) for ngram in self._ngrams(genotype)],
+            dtype=np.uint64,
+        )
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    def sketch(self, genotype_list: list[str]) -> np.ndarray:
+        """Returns a len(genotype_list) x num_perm array of sketches."""
+        sketches = np.empty((len(genotype_list), self.num_perm), dtype=np.uint64)
+        for i, genotype in enumerate(genotype_list):
+            sketch = self._sketches.pop(genotype, None)
+            if sketch is None:
+                sketch = self._sketch(genotype)
+            self._sketches[genotype] = sketch
+            sketches[i] = sketch
+        while len(self._sketches) > self.maxsize:
+            self._sketches.popitem(last=False)
+        return sketches
+
+    def dissimilarity_between(
+        self, genotype_list1: list[str], genotype_list2: list[str]
+    ) -> np.ndarray:
+        return sketch_distances(
+            self.sketch(genotype_list1), self.sketch(genotype_list2)
+        )
+
+    def dissimilarity(self, genotype_list: list[str]) -> np.ndarray:
+        sketches = self.sketch(genotype_list)
+        return sketch_distances(sketches, sketches)
+
+
+def sketch_distances(sketches1: np.ndarray, sketches2: np.ndarray) -> np.ndarray:
+    # estimated Jaccard distance of each pair; rows are processed in chunks to bound the
+    # rows x len(sketches2) x num_perm temporary to about 16M booleans
+    distances = np.empty((len(sketches1), len(sketches2)))
+    chunk_size = max(1, 2**24 // max(1, sketches2.size))
+    for start in range(0, len(sketches1), chunk_size):
+        chunk = sketches1[start : start + chunk_size]
+        distances[start : start + chunk_size] = 1.0 - np.mean(
+            chunk[:, None, :] == sketches2[None, :, :], axis=2
+        )
+    return distances
+
+
+class SketchIndex:
+    """Reference genotypes (e.g. the main population or an archive) for nearest-neighbour
+    and average-distance queries on sketches."""
+
+    def __init__(self, sketcher: MinHashSketcher, genotype_list: list[str]) -> None:
+        self.sketcher = sketcher
+        self.genotypes = list(genotype_list)
+        self.sketches = sketcher.sketch(self.genotypes)
+
+    def distances(self, query_genotypes: list[str]) -> np.ndarray:
+        return sketch_distances(self.sketcher.sketch(query_genotypes), self.sketches)
+
+    def mean_distances(self, query_genotypes: list[str]) -> np.ndarray:
+        return self.distances(query_genotypes).mean(axis=1)
+
+    def nearest(
+        self, query_genotypes: list[str], k: int = 1
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the indices of the k nearest reference genotypes of each query genotype
+        (nearest first) and their distances."""
+        distances = self.distances(query_genotypes)
+        k = min(k, len(self.genotypes))
+        nearest = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return nearest, np.take_along_axis(distances, nearest, axis=1)
+
+
+def nearest_novelty(
+    sketcher: MinHashSketcher,
+    k: int,
+    reserve_genotypes: list[str],
+    main_genotypes: list[str],
+) -> list[float]:
+    """DPGA reserve fitness (toolbox.reserve_fitness) as in novelty search: the mean sketch
+    distance of each reserve genotype to its k nearest main genotypes, so a reserve individual
+    is not rewarded for being far from most of the main population if it is close to some of it.
+    """
+    if not main_genotypes:
+        return [0.0] * len(reserve_genotypes)
+    _, distances = SketchIndex(sketcher, main_genotypes).nearest(reserve_genotypes, k)
+    return distances.mean(axis=1).tolist()
+
+
+def exact_top_k(
+    exact_dissimilarity_between: typing.Callable[[list[str], list[str]], np.ndarray],
+    k: int,
+    reserve_genotypes: list[str],
+    main_genotypes: list[str],
+    fitnesses: list[list[float]],
+    neighbours: int = 0,
+) -> list[list[float]]:
+    """Re-ranks the k reserve individuals with the highest approximate (sketch) fitness by their
+    exact average distance to the main population, or to their `neighbours` nearest main
+    individuals (see nearest_novelty) if it is not 0.
+
+    The k best approximate fitness values are handed out again in the exact order, so the values
+    keep the scale of the sketch distance and individuals outside the top k are not affected.
+    """
+    k = min(k, len(reserve_genotypes))
+    if k < 2 or not main_genotypes:
+        return fitnesses
+    approximate = np.array([fitness[0] for fitness in fitnesses])
+    top = np.argsort(-approximate, kind="stable")[:k]
+    exact = exact_dissimilarity_between(
+        [reserve_genotypes[i] for i in top], main_genotypes
+    )
+    if 0 < neighbours < exact.shape[1]:
+        exact = np.partition(exact, neighbours - 1, axis=1)[:, :neighbours]
+    exact = exact.mean(axis=1)
+    refined = [list(fitness) for fitness in fitnesses]
+    for i, value in zip(top[np.argsort(-exact, kind="stable")], approximate[top]):
+        refined[i] = [float(value)]
+    return refined
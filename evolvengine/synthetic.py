@@ -0,0 +1,248 @@
+import dataclasses
+import random
+import time
+import zlib
+
+import numpy as np
+
+INVALID_GENOTYPE = "/*invalid*/"
+# f1-like symbols: X is a part (joined to the previous one), N a neuron, the rest modify them
+SYMBOLS = "XXXRrLlQqCcFfN"
+
+
+@dataclasses.dataclass
+class CostModel:
+    """Time that an operation takes: `fixed` seconds per call plus `per_char` seconds per character of
+    the genotypes involved. The time is spent busy-waiting, because sleeping is far less precise.
+    """
+
+    fixed: float = 0.0
+    per_char: float = 0.0
+
+    def spend(self, chars: int = 0, calls: int = 1) -> None:
+        seconds = self.fixed * calls + self.per_char * chars
+        if seconds <= 0:
+            return
+        time_end = time.perf_counter() + seconds
+        while time.perf_counter() < time_end:
+            pass
+
+
+class SyntheticFramsticksLib:
+    """A FramsticksLibInterface (see types.py) that needs no Framsticks simulator, to benchmark and
+    test evolvengine algorithms anywhere.
+
+    Genotypes are strings of SYMBOLS: "X" is a part, "N" a neuron, and the simplest genotype is "X"
+    (in every genetic format). Mutation inserts, deletes or replaces a symbol, crossing over joins
+    the halves of the parents. Fitness is a fixed rugged landscape over genotypes: the sum of the
+    pseudo-random weights of their 3-symbol substrings (given by `landscape_seed`), minus a penalty
+    for genotypes longer than `target_length`, reported under every criterion name in CRITERIA.
+    Dissimilarity (every method) compares the symbol counts and lengths of genotypes.
+    There is no evaluation budget, worker pool or dissimilarity cache, but the members that
+    frams_evolve uses for them (see FramsticksLibCompetition and FramsticksLib) are provided.
+
+    The time of each operation follows its CostModel, and mutation, crossing over and evaluation
+    fail with the given rates (evaluation failures are a fixed property of a genotype, as they
+    would be in deterministic simulation). Randomness comes from a generator of the library itself,
+    like in Framsticks, and is reproducible from `seed`.
+    """
+
+    CRITERIA = ["COGpath", "vertpos", "velocity", "distance"]
+
+    def __init__(
+        self,
+        seed: int = 1,
+        landscape_seed: int = 1,
+        target_length: int = 60,
+        mutate_cost: CostModel | None = None,
+        crossover_cost: CostModel | None = None,
+        evaluate_cost: CostModel | None = None,
+        dissimilarity_cost: CostModel | None = None,
+        mutate_invalid_rate: float = 0.0,
+        crossover_invalid_rate: float = 0.0,
+        evaluate_invalid_rate: float = 0.0,
+    ) -> None:
+        self.random = random.Random(seed)
+        self.landscape_seed = landscape_seed
+        self.target_length = target_length
+        self.mutate_cost = mutate_cost or CostModel()
+        self.crossover_cost = crossover_cost or CostModel()
+        self.evaluate_cost = evaluate_cost or CostModel()
+        # per pair of genotypes
+        self.dissimilarity_cost = dissimilarity_cost or CostModel()
+        self.mutate_invalid_rate = mutate_invalid_rate
+        self.crossover_invalid_rate = crossover_invalid_rate
+        self.evaluate_invalid_rate = evaluate_invalid_rate
+        self.evaluation_count = 0
+        self.pool = None
+        self.dissimilarity_cache_misses = 0
+
+    def _hash(self, text: str) -> float:
+        # deterministic in [0, 1), unlike hash() which differs between interpreter runs
+        return zlib.crc32(("%d|%s" % (self.landscape_seed, text)).encode()) / 2**32
+
+    def _fitness(self, genotype: str) -> float:
+        weights = sum(self._hash(genotype[i : i + 3]) for i in range(len(genotype) - 2))
+        return weights - max(0, len(genotype) - self.target_length)
+
+    def getSimplest(self, genetic_format: str) -> str:
+        return "X"
+
+    def getPJNC(self, genotype: str) -> tuple[int, int, int, int] | None:
+        if genotype == INVALID_GENOTYPE:
+            return None
+        parts = genotype.count("X")
+        neurons = genotype.count("N")
+        return parts, max(parts - 1, 0), neurons, max(neurons - 1, 0)
+
+    def getF0(self, genotype: str) -> str | None:
+        pjnc = self.getPJNC(genotype)
+        if pjnc is None:
+            return None
+        parts, joints, neurons, connections = pjnc
+        return "//0\n" + "".join(
+            ["p:\n"] * parts
+            + ["j:\n"] * joints
+            + ["n:\n"] * neurons
+            + ["c:\n"] * connections
+        )
+
+    def isValid(self, genotype_list: list[str]) -> list[bool]:
+        return [genotype != INVALID_GENOTYPE for genotype in genotype_list]
+
+    def isValidCreature(self, genotype_list: list[str]) -> list[bool]:
+        return self.isValid(genotype_list)
+
+    def evaluate(self, genotype_list: list[str]) -> list[dict]:
+        self.evaluate_cost.spend(sum(map(len, genotype_list)), len(genotype_list))
+        self.evaluation_count += len(genotype_list)
+        results = []
+        for genotype in genotype_list:
+            if (
+                genotype == INVALID_GENOTYPE
+                or self._hash("invalid|" + genotype) < self.evaluate_invalid_rate
+            ):
+                results.append({"num": 0, "name": genotype, "evaluations": None})
+                continue
+            parts, joints, neurons, connections = self.getPJNC(genotype)
+            evaluation = {
+                criterion: self._fitness(genotype) for criterion in self.CRITERIA
+            }
+            evaluation.update(
+                numparts=parts,
+                numjoints=joints,
+                numneurons=neurons,
+                numconnections=connections,
+            )
+            results.append(
+                {"num": 0, "name": genotype, "evaluations": {"": evaluation}}
+            )
+        return results
+
+    def _mutate(self, genotype: str) -> str:
+        if (
+            genotype == INVALID_GENOTYPE
+            or self.random.random() < self.mutate_invalid_rate
+        ):
+            return INVALID_GENOTYPE
+        position = self.random.randrange(len(genotype) + 1)
+        operation = self.random.randrange(3) if len(genotype) > 1 else 0
+        if operation == 0:  # insert
+            return (
+                genotype[:position] + self.random.choice(SYMBOLS) + genotype[position:]
+            )
+        position = min(position, len(genotype) - 1)
+        if operation == 1:  # delete
+            return genotype[:position] + genotype[position + 1 :]
+        return (  # replace
+            genotype[:position] + self.random.choice(SYMBOLS) + genotype[position + 1 :]
+        )
+
+    def mutate(self, genotype_list: list[str]) -> list[str]:
+        self.mutate_cost.spend(sum(map(len, genotype_list)), len(genotype_list))
+        return [self._mutate(genotype) for genotype in genotype_list]
+
+    def crossOver(self, genotype1: str, genotype2: str) -> str:
+        self.crossover_cost.spend(len(genotype1) + len(genotype2))
+        if (
+            INVALID_GENOTYPE in (genotype1, genotype2)
+            or self.random.random() < self.crossover_invalid_rate
+        ):
+            return INVALID_GENOTYPE
+        cut1 = self.random.randrange(len(genotype1) + 1)
+        cut2 = self.random.randrange(len(genotype2) + 1)
+        return genotype1[:cut1] + genotype2[cut2:] or "X"
+
+    def getRandomGenotype(
+        self,
+        initial_genotype: str,
+        parts_min: int,
+        parts_max: int,
+        neurons_min: int,
+        neurons_max: int,
+        iter_max: int,
+        return_even_if_failed: bool,
+    ) -> str | None:
+        # like FramsticksLib: mutates towards random target numbers of parts and neurons
+        target_parts = self.random.randint(parts_min, parts_max)
+        target_neurons = self.random.randint(neurons_min, neurons_max)
+
+        def difference(genotype):
+            pjnc = self.getPJNC(genotype)
+            if pjnc is None:
+                return None
+            return abs(pjnc[0] - target_parts) + abs(pjnc[2] - target_neurons)
+
+        genotype = initial_genotype
+        best = difference(genotype)
+        for _ in range(iter_max):
+            if best == 0:
+                break
+            mutant = self.mutate([genotype])[0]
+            mutant_difference = difference(mutant)
+            if mutant_difference is not None and (
+                best is None or mutant_difference <= best
+            ):
+                genotype, best = mutant, mutant_difference
+        if best == 0 or return_even_if_failed:
+            return genotype
+        return None
+
+    def profiles(self, genotype_list: list[str]) -> np.ndarray:
+        """Returns the symbol counts and the length of each genotype, which dissimilarity compares."""
+        profiles = np.zeros((len(genotype_list), len(set(SYMBOLS)) + 1))
+        symbols = sorted(set(SYMBOLS))
+        for i, genotype in enumerate(genotype_list):
+            profiles[i, :-1] = [genotype.count(symbol) for symbol in symbols]
+            profiles[i, -1] = len(genotype)
+        return profiles
+
+    def dissimilarityBetween(
+        self, genotype_list1: list[str], genotype_list2: list[str], method: int
+    ) -> np.ndarray:
+        self.dissimilarity_cost.spend(calls=len(genotype_list1) * len(genotype_list2))
+        profiles1 = self.profiles(genotype_list1)
+        profiles2 = self.profiles(genotype_list2)
+        # one symbol at a time, so large populations do not need a rows x columns x symbols array
+        matrix = np.zeros((len(genotype_list1), len(genotype_list2)))
+        for column in range(profiles1.shape[1]):
+            matrix += np.abs(profiles1[:, column, None] - profiles2[None, :, column])
+        return matrix
+
+    def dissimilarity(self, genotype_list: list[str], method: int) -> np.ndarray:
+        return self.dissimilarityBetween(genotype_list, genotype_list, method)
+
+    def chargeCacheHits(self, count: int) -> int:
+        return count
+
+    def recordResults(self, genotype_list: list[str], results: list) -> None:
+        pass
+
+    def getBudgetState(self) -> dict:
+        return {"evaluation_count": self.evaluation_count}
+
+    def setBudgetState(self, state: dict) -> None:
+        self.evaluation_count = state["evaluation_count"]
+
+    def end(self) -> None:
+        pass
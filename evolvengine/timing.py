@@ -0,0 +1,123 @@
+import collections
+import contextlib
+import functools
+import time
+import typing
+
+import deap.base
+import deap.tools
+
+# phase -> toolbox functions whose calls are timed as that phase; the algorithms evaluate
+# individuals with toolbox.map(toolbox.evaluate, ...)
+TOOLBOX_PHASES = {
+    "select": ["select"],
+    "mutate": ["mutate"],
+    "mate": ["mate"],
+    "evaluate": ["map"],
+    "dissimilarity": [
+        "dissimilarity",
+        "dissimilarity_between",
+        "reserve_fitness",
+        "exact_top_k",
+    ],
+    "io": ["checkpoint", "results"],
+}
+PHASES = ["select", "mutate", "mate", "evaluate", "dissimilarity", "stats", "hof", "io"]
+
+
+class PhaseTimer:
+    """Wall time spent in the phases of each generation, as logbook columns t_<phase>, and t_gen
+    for the whole generation.
+
+    Instead of timing code in the generational loops, `instrument` wraps the toolbox functions,
+    the statistics and the hall of fame that the loops call, so a run without a timer is not
+    affected at all. Columns are collected when the statistics are compiled, so the time spent on
+    compiling the statistics, and on saving (io) after the logbook record, are those of the previous
+    generation. `summary` reports the totals of the whole run.
+    """
+
+    def __init__(self) -> None:
+        # phase -> seconds since the last logbook record, and in the whole run
+        self.pending = collections.defaultdict(float)
+        self.total = collections.defaultdict(float)
+        self._time_start = time.perf_counter()
+        self._time_record = self._time_start
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.pending[phase] += seconds
+        self.total[phase] += seconds
+
+    @contextlib.contextmanager
+    def phase(self, phase: str) -> typing.Iterator[None]:
+        time_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - time_start)
+
+    def timed(self, phase: str, func: typing.Callable) -> typing.Callable:
+        @functools.wraps(func)
+        def timed_func(*args, **kwargs):
+            time_start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - time_start)
+
+        return timed_func
+
+    def instrument(
+        self,
+        toolbox: deap.base.Toolbox,
+        stats: deap.tools.Statistics | None = None,
+        halloffame: deap.tools.HallOfFame | None = None,
+    ) -> None:
+        """Times the calls of `toolbox`, `stats` and `halloffame` from now on, and adds the timing
+        columns to `stats`. Call it after everything the algorithm uses is registered.
+        """
+        for phase, names in TOOLBOX_PHASES.items():
+            for name in names:
+                func = getattr(toolbox, name, None)
+                if func is not None:
+                    setattr(toolbox, name, self.timed(phase, func))
+        if halloffame is not None:
+            halloffame.update = self.timed("hof", halloffame.update)
+        if stats is not None:
+            stats.compile = self.timed("stats", stats.compile)
+            for phase in PHASES:
+                stats.register("t_" + phase, self.collector(phase))
+            stats.register("t_gen", self.collect_generation)
+        # for the code that the algorithms run themselves, see phase() below
+        toolbox.register("phase", self.phase)
+        self._time_start = self._time_record = time.perf_counter()
+
+    def collector(self, phase: str) -> typing.Callable[[typing.Any], float]:
+        def collect(_pop_fitnesses: typing.Any = None) -> float:
+            return self.pending.pop(phase, 0.0)
+
+        return collect
+
+    def collect_generation(self, _pop_fitnesses: typing.Any = None) -> float:
+        now = time.perf_counter()
+        seconds = now - self._time_record
+        self._time_record = now
+        return seconds
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self._time_start
+        lines = ["Time per phase (of %.3fs):" % elapsed]
+        for phase in PHASES + ["other"]:
+            if phase == "other":
+                seconds = elapsed - sum(self.total.values())
+            else:
+                seconds = self.total.get(phase, 0.0)
+            share = 100 * seconds / elapsed if elapsed > 0 else 0.0
+            lines.append("  %-14s %10.3fs %6.1f%%" % (phase, seconds, share))
+        return "\n".join(lines)
+
+
+def phase(toolbox: deap.base.Toolbox, phase: str) -> typing.ContextManager:
+    # times code that the algorithms run themselves rather than through the toolbox, if the
+    # toolbox is instrumented by a PhaseTimer
+    toolbox_phase = getattr(toolbox, "phase", None)
+    return contextlib.nullcontext() if toolbox_phase is None else toolbox_phase(phase)
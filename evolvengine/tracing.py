@@ -0,0 +1,282 @@
+import collections
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from . import types
+
+INVALID_GENOTYPE = "/*invalid*/"
+
+
+def genetic_format(genotype: str) -> str:
+    # Framsticks marks the format as "//0" on the first line (f0) or with a "/*9*/" prefix,
+    # genotypes without a mark are f1
+    if genotype.startswith("//"):
+        return genotype[2:].split("\n", 1)[0].strip()
+    if genotype.startswith("/*"):
+        end = genotype.find("*/")
+        if end > 2:
+            return genotype[2:end]
+    return "1"
+
+
+class OperationStats:
+    """Calls of one operation for one genetic format: their number, latencies (total and a
+    histogram with power-of-two buckets in microseconds), batch sizes and invalid results.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.items = 0  # genotypes (or pairs) in all batches
+        self.max_batch = 0
+        self.invalid = 0  # items with an invalid result
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = collections.Counter()  # bucket b: latency in [2^(b-1), 2^b) us
+
+    def add(self, seconds: float, batch: int, invalid: int) -> None:
+        self.calls += 1
+        self.items += batch
+        self.max_batch = max(self.max_batch, batch)
+        self.invalid += invalid
+        self.total_time += seconds
+        self.max_time = max(self.max_time, seconds)
+        self.histogram[max(0, math.ceil(math.log2(max(seconds * 1e6, 1.0))))] += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound (in seconds) of the latency below which q of the calls are."""
+        rank = q * self.calls
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= rank:
+                return min(2**bucket / 1e6, self.max_time)
+        return self.max_time
+
+
+class TracingLib:
+    """Records the calls of the operations of a FramsticksLib-compatible object that cross into
+    the simulator: how many, how long (latency histograms), how big the batches, and how many
+    results were invalid, per operation and genetic format. The format of a batch is the format
+    of its first genotype.
+
+    `summary` describes all the calls so far. If `trace_path` is given, every call (up to
+    `max_events`) is also saved there by `close` as Trace Event Format JSON, for a timeline viewer
+    such as chrome://tracing or https://ui.perfetto.dev. `end` calls `close`, so the summary and
+    the trace are saved also when the competition library ends the program.
+    All other methods are passed through to the wrapped `lib`.
+    """
+
+    def __init__(
+        self,
+        lib: types.FramsticksLibInterface,
+        trace_path: str | None = None,
+        max_events: int = 1_000_000,
+    ) -> None:
+        self.lib = lib
+        self.trace_path = trace_path
+        self.max_events = max_events
+        # (operation, genetic format) -> OperationStats
+        self.stats = collections.defaultdict(OperationStats)
+        self.events = []
+        self.dropped_events = 0
+        self._time_start = time.perf_counter()
+        self._closed = False
+
+    def __getattr__(self, name: str):
+        return getattr(self.lib, name)
+
+    def _record(
+        self,
+        operation: str,
+        genotype: str | list[str],
+        time_start: float,
+        batch: int = 1,
+        invalid: int = 0,
+    ) -> None:
+        seconds = time.perf_counter() - time_start
+        if isinstance(genotype, list):  # a batch, of the format of its first genotype
+            genotype = genotype[0] if genotype else ""
+        gen_format = genetic_format(genotype)
+        self.stats[operation, gen_format].add(seconds, batch, invalid)
+        if self.trace_path is None:
+            return
+        if len(self.events) >= self.max_events:
+            self.dropped_events += 1
+            return
+        self.events.append(
+            {
+                "name": operation,
+                "cat": "f" + gen_format,
+                "ph": "X",
+                "ts": (time_start - self._time_start) * 1e6,
+                "dur": seconds * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {"batch": batch, "invalid": invalid},
+            }
+        )
+
+    def evaluate(self, genotype_list: list[str]) -> list:
+        time_start = time.perf_counter()
+        results = self.lib.evaluate(genotype_list)
+        invalid = sum(
+            1
+            for result in results
+            if result is None
+            or (isinstance(result, dict) and result.get("evaluations") is None)
+        )
+        self._record("evaluate", genotype_list, time_start, len(genotype_list), invalid)
+        return results
+
+    def mutate(self, genotype_list: list[str]) -> list[str]:
+        time_start = time.perf_counter()
+        mutants = self.lib.mutate(genotype_list)
+        invalid = mutants.count(INVALID_GENOTYPE)
+        self._record("mutate", genotype_list, time_start, len(genotype_list), invalid)
+        return mutants
+
+    def crossOver(self, genotype1: str, genotype2: str) -> str:
+        time_start = time.perf_counter()
+        offspring = self.lib.crossOver(genotype1, genotype2)
+        invalid = int(offspring == INVALID_GENOTYPE)
+        self._record("crossOver", genotype1, time_start, invalid=invalid)
+        return offspring
+
+    def dissimilarity(self, genotype_list: list[str], method: int) -> np.ndarray:
+        time_start = time.perf_counter()
+        matrix = self.lib.dissimilarity(genotype_list, method)
+        self._record(
+            "dissimilarity(%d)" % method,
+            genotype_list,
+            time_start,
+            len(genotype_list),
+        )
+        return matrix
+
+    def dissimilarityBetween(
+        self, genotype_list1: list[str], genotype_list2: list[str], method: int
+    ) -> np.ndarray:
+        time_start = time.perf_counter()
+        matrix = self.lib.dissimilarityBetween(genotype_list1, genotype_list2, method)
+        self._record(
+            "dissimilarityBetween(%d)" % method,
+            genotype_list1,
+            time_start,
+            len(genotype_list1) * len(genotype_list2),
+        )
+        return matrix
+
+    def isValid(self, genotype_list: list[str]) -> list[bool]:
+        time_start = time.perf_counter()
+        valid = self.lib.isValid(genotype_list)
+        self._record(
+            "isValid",
+            genotype_list,
+            time_start,
+            len(genotype_list),
+            valid.count(False),
+        )
+        return valid
+
+    def isValidCreature(self, genotype_list: list[str]) -> list[bool]:
+        time_start = time.perf_counter()
+        valid = self.lib.isValidCreature(genotype_list)
+        self._record(
+            "isValidCreature",
+            genotype_list,
+            time_start,
+            len(genotype_list),
+            valid.count(False),
+        )
+        return valid
+
+    def getRandomGenotype(self, initial_genotype: str, *args, **kwargs) -> str | None:
+        time_start = time.perf_counter()
+        genotype = self.lib.getRandomGenotype(initial_genotype, *args, **kwargs)
+        invalid = int(genotype is None)
+        self._record("getRandomGenotype", initial_genotype, time_start, invalid=invalid)
+        return genotype
+
+    def getF0(self, genotype: str) -> str | None:
+        time_start = time.perf_counter()
+        f0 = self.lib.getF0(genotype)
+        self._record("getF0", genotype, time_start, invalid=int(f0 is None))
+        return f0
+
+    def getPJNC(self, genotype: str) -> tuple[int, int, int, int] | None:
+        time_start = time.perf_counter()
+        pjnc = self.lib.getPJNC(genotype)
+        self._record("getPJNC", genotype, time_start, invalid=int(pjnc is None))
+        return pjnc
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self._time_start
+        lines = [
+            "Framsticks calls (of %.3fs):" % elapsed,
+            "  %-26s %-4s %8s %9s %9s %8s %9s %6s %8s %8s %8s %8s"
+            % (
+                "operation",
+                "fmt",
+                "calls",
+                "items",
+                "max_items",
+                "invalid%",
+                "total_s",
+                "share%",
+                "mean_ms",
+                "p50_ms",
+                "p99_ms",
+                "max_ms",
+            ),
+        ]
+        for (operation, gen_format), stats in sorted(
+            self.stats.items(), key=lambda item: item[1].total_time, reverse=True
+        ):
+            lines.append(
+                "  %-26s f%-3s %8d %9d %9d %8.2f %9.3f %6.1f %8.3f %8.3f %8.3f %8.3f"
+                % (
+                    operation,
+                    gen_format,
+                    stats.calls,
+                    stats.items,
+                    stats.max_batch,
+                    100 * stats.invalid / max(stats.items, 1),
+                    stats.total_time,
+                    100 * stats.total_time / elapsed if elapsed > 0 else 0.0,
+                    1e3 * stats.total_time / stats.calls,
+                    1e3 * stats.percentile(0.5),
+                    1e3 * stats.percentile(0.99),
+                    1e3 * stats.max_time,
+                )
+            )
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        print(self.summary())
+        if self.trace_path is not None:
+            with open(self.trace_path, "w") as outfile:
+                json.dump({"traceEvents": self.events}, outfile)
+            print(
+                "Saved %d calls to '%s'%s"
+                % (
+                    len(self.events),
+                    self.trace_path,
+                    (
+                        " (%d more were not saved)" % self.dropped_events
+                        if self.dropped_events
+                        else ""
+                    ),
+                )
+            )
+
+    def end(self) -> None:
+        self.close()
+        self.lib.end()
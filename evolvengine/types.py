@@ -27,6 +27,8 @@ class FramsticksLibInterface(typing.Protocol):
     def crossOver(self, genotype1: str, genotype2: str) -> str: ...
     def mutate(self, genotypes: list[str]) -> list[str]: ...
     def getSimplest(self, genetic_format: str) -> str: ...
+    def getF0(self, genotype: str) -> str | None: ...
+    def getPJNC(self, genotype: str) -> tuple[int, int, int, int] | None: ...
     def getRandomGenotype(
         self,
         initial_genotype: str,
@@ -38,6 +40,9 @@ class FramsticksLibInterface(typing.Protocol):
         return_even_if_failed: bool,
     ) -> str: ...
     def dissimilarity(self, genotype_list: List[str], method: int) -> np.ndarray: ...
+    def dissimilarityBetween(
+        self, genotype_list1: List[str], genotype_list2: List[str], method: int
+    ) -> np.ndarray: ...
 
 
 class EvolutionaryAlgorithm(typing.Protocol):
@@ -82,6 +87,29 @@ class RunConfig:
     rand_prob: float
     dissimilarity_method: int
     predefined_file: str | None = None
+    workers: int = 1
+    cache_size: int = 0
+    cache_file: str | None = None
+    cache_canonical: bool = False
+    sketch_size: int = 64
+    sketch_exact_top_k: int = 0
+    sketch_exact_method: int = -1
+    sketch_novelty_k: int = 0
+    tiered_proxy_method: int | None = None
+    tiered_exact_fraction: float = 0.2
+    tiered_recalibration: int = 5
+    reserve_ratio: float = 0.6
+    islands: int = 1
+    migration_interval: int = 5
+    migrants: int = 2
+    checkpoint_file: str | None = None
+    checkpoint_period: int = 10
+    checkpoint_max_overhead: float = 0.05
+    resume: str | None = None
+    stream_results: bool = False
+    timing: bool = False
+    trace: bool = False
+    trace_file: str | None = None
 
     def __post_init__(self):
         if not isinstance(self.opt, list):
@@ -229,13 +257,146 @@ class RunConfig:
             "-dissimilarity_method",
             type=int,
             default=0,
-            help="Method of dissimilarity calculation, default: 0 (SimilMeasureGreedy)",
+            help="Method of dissimilarity calculation, default: 0 (SimilMeasureGreedy). -4 = approximate MinHash sketch distance of genotypes, for large populations",
         )
         parser.add_argument(
             "-predefined_file",
             default=None,
             help="Path to the file with genotypes to load. If not given, the initial genotype will be used.", # TODO: change docs
         )
+        parser.add_argument(
+            "-workers",
+            type=int,
+            default=1,
+            help="Number of worker processes evaluating genotypes, each with its own Framsticks library instance. Default: 1 (evaluate in the main process)",
+        )
+        parser.add_argument(
+            "-cache_size",
+            type=int,
+            default=0,
+            help="Number of genotype evaluations kept in memory so that repeated genotypes are not simulated again. Only use with deterministic evaluation (deterministic.sim). Default: 0 (no cache)",
+        )
+        parser.add_argument(
+            "-cache_file",
+            default=None,
+            help="SQLite file where the evaluation cache is persisted and shared between runs with the same -sim and -opt_func. Requires -cache_size > 0. Default: none (memory only)",
+        )
+        parser.add_argument(
+            "-cache_canonical",
+            action="store_true",
+            help="Key the evaluation cache by the f0 phenotype instead of the genotype string, so genotypes that build the same creature are simulated once. Requires -cache_size > 0.",
+        )
+        parser.add_argument(
+            "-sketch_size",
+            type=int,
+            default=64,
+            help="Number of MinHash values per genotype for -dissimilarity_method -4. Larger sketches estimate distances more precisely. Default: 64",
+        )
+        parser.add_argument(
+            "-sketch_exact_top_k",
+            type=int,
+            default=0,
+            help="With -dissimilarity_method -4, re-rank the k most diverse reserve individuals of DPGA by their exact distance (-sketch_exact_method). Default: 0 (approximate only)",
+        )
+        parser.add_argument(
+            "-sketch_exact_method",
+            type=int,
+            default=-1,
+            help="Exact dissimilarity method used by -sketch_exact_top_k. Default: -1 (Levenshtein distance)",
+        )
+        parser.add_argument(
+            "-sketch_novelty_k",
+            type=int,
+            default=0,
+            help="With -dissimilarity_method -4, the fitness of DPGA reserve individuals is their mean sketch distance to their k nearest main individuals (novelty) instead of to all of them. Default: 0 (all)",
+        )
+        parser.add_argument(
+            "-tiered_proxy_method",
+            type=int,
+            default=None,
+            help="Cheap dissimilarity method (e.g. -1 or -4) used by DPGA to rank reserve individuals, only the best and worst of them are scored with -dissimilarity_method. Default: none (score all exactly)",
+        )
+        parser.add_argument(
+            "-tiered_exact_fraction",
+            type=float,
+            default=0.2,
+            help="Fraction of reserve individuals scored exactly with -tiered_proxy_method, half from the top and half from the bottom of the proxy ranking. Default: 0.2",
+        )
+        parser.add_argument(
+            "-tiered_recalibration",
+            type=int,
+            default=5,
+            help="With -tiered_proxy_method, every how many generations all reserve individuals are scored exactly to recalibrate the proxy and measure its rank agreement. Default: 5",
+        )
+        parser.add_argument(
+            "-reserve_ratio",
+            type=float,
+            default=0.6,
+            help="Fraction of the DPGA population that forms the reserve population, the rest is the main population. Default: 0.6",
+        )
+        parser.add_argument(
+            "-islands",
+            type=int,
+            default=1,
+            help="Number of DPGA islands, each with its own main and reserve population, running in its own process with its own Framsticks library and an equal share of the evaluation budget. The merged results are saved to -out, and the Framsticks library reports the best solution of all islands and their total number of evaluations at the end (e.g. one line in the competition .results file). Default: 1 (no islands)",
+        )
+        parser.add_argument(
+            "-migration_interval",
+            type=int,
+            default=5,
+            help="With -islands > 1, every how many generations each island sends migrants to the next island (in a ring). Default: 5",
+        )
+        parser.add_argument(
+            "-migrants",
+            type=int,
+            default=2,
+            help="With -islands > 1, how many of the best main and of the best reserve individuals migrate. Default: 2 (i.e. 2 + 2)",
+        )
+        parser.add_argument(
+            "-checkpoint_file",
+            type=str,
+            default=None,
+            help="File to periodically save the whole state of evolution to (populations, hall of fame, logbook, random generators, mutators, used budget), so that an interrupted run can be continued with -resume. Default: no checkpoints, or the -resume file when resuming",
+        )
+        parser.add_argument(
+            "-checkpoint_period",
+            type=int,
+            default=10,
+            help="With -checkpoint_file, every how many generations a checkpoint is saved. Default: 10",
+        )
+        parser.add_argument(
+            "-checkpoint_max_overhead",
+            type=float,
+            default=0.05,
+            help="With -checkpoint_file, the largest fraction of the running time that may be spent on saving checkpoints; checkpoints that would exceed it are postponed. Default: 0.05",
+        )
+        parser.add_argument(
+            "-resume",
+            type=str,
+            default=None,
+            help="Checkpoint file (see -checkpoint_file) to continue an interrupted run from. The Python and NumPy random generators are restored exactly, but the random generator of Framsticks (used e.g. by mutation and crossing over) is not, so the results may differ from those of an uninterrupted run. The other arguments should be the same as in the interrupted run.",
+        )
+        parser.add_argument(
+            "-stream_results",
+            action="store_true",
+            help="Save results to -out as JSON lines appended after every generation by a background thread (see evolvengine/results.py), instead of one JSON document written at the end (and every 5 generations by DPGA). Both formats are read by parse_hofs.py and vis/interpret.py.",
+        )
+        parser.add_argument(
+            "-timing",
+            action="store_true",
+            help="Record the wall time of the phases of each generation (selection, mutation, crossover, evaluation, dissimilarity, statistics, hall of fame, saving) in logbook columns t_<phase> and t_gen, and print a summary at the end (see evolvengine/timing.py).",
+        )
+        parser.add_argument(
+            "-trace",
+            action="store_true",
+            help="Record the calls of Framsticks library operations (counts, latency histograms, batch sizes, invalid results per operation and genetic format) and print a summary at the end (see evolvengine/tracing.py).",
+        )
+        parser.add_argument(
+            "-trace_file",
+            type=str,
+            default=None,
+            help="Like -trace, and also save every call to this file in Trace Event Format, to be viewed in chrome://tracing or https://ui.perfetto.dev",
+        )
 
         args = parser.parse_args()
         return cls(**vars(args))
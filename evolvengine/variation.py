@@ -0,0 +1,97 @@
+import random
+
+import deap.base
+
+from . import types
+
+
+# DEAP's varAnd/varOr invalidate the fitness of every individual that went through crossover or
+# mutation. Framsticks operators often leave the genotype as it was (e.g. frams_mutate and
+# frams_crossover keep the parent when the operator returns /*invalid*/, the annealing mutator
+# may skip mutation), so the same genotype would be simulated again. The functions below consume
+# random numbers exactly like their DEAP counterparts, but an individual whose genotype string is
+# unchanged keeps its parent's fitness. The number of such individuals is reported to
+# toolbox.unchanged(count) if the toolbox has it registered.
+
+
+def _report_unchanged(toolbox: deap.base.Toolbox, count: int) -> None:
+    report = getattr(toolbox, "unchanged", None)
+    if report is not None and count > 0:
+        report(count)
+
+
+def _settle_fitness(individual: types.Individual, parent_genotype: str) -> bool:
+    # returns True if an evaluation was saved
+    if individual[0] == parent_genotype and individual.fitness.valid:
+        return True
+    del individual.fitness.values
+    return False
+
+
+def var_and(
+    population: list[types.Individual],
+    toolbox: deap.base.Toolbox,
+    cxpb: float,
+    mutpb: float,
+    report_unchanged: bool = True,
+) -> list[types.Individual]:
+    offspring = [toolbox.clone(ind) for ind in population]
+    parent_genotypes = [ind[0] for ind in offspring]
+    varied = [False] * len(offspring)
+
+    for i in range(1, len(offspring), 2):
+        if random.random() < cxpb:
+            offspring[i - 1], offspring[i] = toolbox.mate(
+                offspring[i - 1], offspring[i]
+            )
+            varied[i - 1] = varied[i] = True
+
+    for i in range(len(offspring)):
+        if random.random() < mutpb:
+            (offspring[i],) = toolbox.mutate(offspring[i])
+            varied[i] = True
+
+    saved = sum(
+        _settle_fitness(ind, parent_genotype)
+        for ind, parent_genotype, was_varied in zip(offspring, parent_genotypes, varied)
+        if was_varied
+    )
+    if report_unchanged:
+        _report_unchanged(toolbox, saved)
+    return offspring
+
+
+def var_or(
+    population: list[types.Individual],
+    toolbox: deap.base.Toolbox,
+    lambda_: int,
+    cxpb: float,
+    mutpb: float,
+    report_unchanged: bool = True,
+) -> list[types.Individual]:
+    assert (
+        cxpb + mutpb
+    ) <= 1.0, "The sum of the crossover and mutation probabilities must be smaller or equal to 1.0."
+
+    offspring = []
+    saved = 0
+    for _ in range(lambda_):
+        op_choice = random.random()
+        if op_choice < cxpb:
+            ind1, ind2 = [toolbox.clone(i) for i in random.sample(population, 2)]
+            parent_genotype = ind1[0]
+            ind1, ind2 = toolbox.mate(ind1, ind2)
+            saved += _settle_fitness(ind1, parent_genotype)
+            offspring.append(ind1)
+        elif op_choice < cxpb + mutpb:
+            ind = toolbox.clone(random.choice(population))
+            parent_genotype = ind[0]
+            (ind,) = toolbox.mutate(ind)
+            saved += _settle_fitness(ind, parent_genotype)
+            offspring.append(ind)
+        else:
+            offspring.append(random.choice(population))
+
+    if report_unchanged:
+        _report_unchanged(toolbox, saved)
+    return offspring
@@ -1,6 +1,8 @@
 import sys
 import random
 
+import deap.base
+import deap.tools
 import numpy as np
 import evolvengine.predefiner
 import evolvengine.runner
@@ -9,23 +11,76 @@ import evolvengine.algorithms
 import evolvengine.defaults
 import evolvengine.mutator
 import evolvengine.randomizer
+import evolvengine.pool
+import evolvengine.cache
+import evolvengine.canonical
+import evolvengine.screening
+import evolvengine.counters
+import evolvengine.islands
+import evolvengine.checkpoint
+import evolvengine.tracing
 
 sys.path.append("..")
 
 from FramsticksLibCompetition import FramsticksLibCompetition as FramsticksLib
+from FramsticksLib import FramsticksLib as WorkerFramsticksLib
 
 
 def setup_lib(config: evolvengine.types.RunConfig) -> FramsticksLib:
     FramsticksLib.DETERMINISTIC = True
+    # the runner stops when the budget is exhausted, saves its output, and then end() is called
+    FramsticksLib.EXIT_ON_BUDGET_EXHAUSTED = False
+    WorkerFramsticksLib.DETERMINISTIC = True
+    if config.islands > 1:
+        # each island runs in its own process with its own lib, so the budget is shared out between them
+        FramsticksLib.MAX_EVALUATIONS //= config.islands
     random.seed(config.seed)
     np.random.seed(config.seed)
-    return FramsticksLib(config.path, None, config.sim)
+    lib = FramsticksLib(config.path, None, config.sim)
+    if config.workers > 1:
+        # workers only simulate; budget and COG path fitness stay with the competition lib in this process
+        lib.pool = evolvengine.pool.FramsticksPool(
+            WorkerFramsticksLib, config.path, None, config.sim, config.workers
+        )
+    return lib
 
 
-def main():
-    config = evolvengine.types.RunConfig.from_args()
-    lib = setup_lib(config)
+def setup_cache(
+    lib: FramsticksLib, config: evolvengine.types.RunConfig
+) -> evolvengine.cache.EvaluationCache | None:
+    if config.cache_size <= 0:
+        return None
+    key_func = None
+    if config.cache_canonical:
+        key_func = evolvengine.canonical.Canonicalizer(lib, config.cache_size).key
+    return evolvengine.cache.EvaluationCache(
+        lib,
+        namespace="%s|%d" % (config.sim, config.opt_func),
+        maxsize=config.cache_size,
+        path=config.cache_file,
+        key_func=key_func,
+        on_hits=lib.chargeCacheHits,
+        on_hit_results=lib.recordResults,
+    )
+
+
+def setup_evolution(
+    config: evolvengine.types.RunConfig,
+    lib: evolvengine.types.FramsticksLibInterface | None = None,
+) -> tuple[
+    FramsticksLib,
+    evolvengine.cache.EvaluationCache | None,
+    deap.base.Toolbox,
+    deap.tools.Statistics,
+]:
+    # a given lib (such as evolvengine.synthetic.SyntheticFramsticksLib) is used as it is
+    if lib is None:
+        lib = setup_lib(config)
     lib.TEST_FUNCTION = config.opt_func
+    if config.trace or config.trace_file is not None:
+        # everything below uses the library through the tracer, which reports when lib.end() is called
+        lib = evolvengine.tracing.TracingLib(lib, config.trace_file)
+    cache = setup_cache(lib, config)
 
     toolbox = evolvengine.defaults.setup_toolbox(lib, config)
     stats = evolvengine.defaults.setup_stats()
@@ -38,10 +93,31 @@ def main():
         genformat=config.genformat,
         gen_path=config.predefined_file,
     )
-    toolbox = evolvengine.defaults.setup_toolbox(lib, config)
+    screen = evolvengine.screening.ConstraintScreen(lib, config, cache)
+    toolbox = evolvengine.defaults.setup_toolbox(
+        lib if cache is None else cache,
+        config,
+        screen=screen if screen.enabled else None,
+    )
     toolbox.register("population", predefiner.get_population)
 
     stats = evolvengine.defaults.setup_stats()
+    unchanged = evolvengine.counters.Counter()
+    toolbox.register("unchanged", unchanged.add)
+    stats.register("nsaved", unchanged.collect)
+    if screen.enabled:
+        stats.register("screened", screen.rejected.collect)
+    if cache is not None:
+        stats.register("cache_hits", cache.hits.collect)
+        stats.register("cache_misses", cache.misses.collect)
+        if config.cache_canonical:
+            stats.register("cache_f0_hits", cache.key_hits.collect)
+    if config.tiered_proxy_method is not None:
+        tiered = evolvengine.defaults.setup_tiered_reserve_fitness(
+            lib if cache is None else cache, config
+        )
+        toolbox.register("reserve_fitness", tiered)
+        stats.register("proxy_agreement", tiered.collect)
     vs_mutator = evolvengine.mutator.VaryingStrengthMutator(
         mutate_func=evolvengine.defaults.frams_mutate, upper_bound=config.mutator_ub
     )
@@ -56,9 +132,74 @@ def main():
 
     toolbox.register("mutate", lambda x: randomizer.randomize(mutate_callback(lib, x)))
 
+    if config.checkpoint_file is not None or config.resume is not None:
+        checkpointer = evolvengine.checkpoint.Checkpointer(
+            config.checkpoint_file or config.resume,
+            period=config.checkpoint_period,
+            max_overhead=config.checkpoint_max_overhead,
+            resume_path=config.resume,
+        )
+        checkpointer.register("budget", lib.getBudgetState, lib.setBudgetState)
+        checkpointer.register_attributes(
+            "vs_mutator", vs_mutator, ["max_fit_history", "strength"]
+        )
+        if config.temp > 0:
+            checkpointer.register_attributes(
+                "sa_mutator", sa_mutator, ["temperature", "previous_fitness"]
+            )
+        if config.tiered_proxy_method is not None:
+            checkpointer.register_attributes(
+                "tiered_reserve_fitness",
+                tiered,
+                [
+                    "slope",
+                    "intercept",
+                    "agreement",
+                    "_generations_since_calibration",
+                    "_main_genotypes",
+                ],
+            )
+        if cache is not None:
+            # cached evaluations are not simulated again, which affects the used budget
+            checkpointer.register_attributes("evaluation_cache", cache, ["_entries"])
+        toolbox.register("checkpoint", checkpointer)
+        toolbox.register("resume", checkpointer.resume)
+    return lib, cache, toolbox, stats
+
+
+def finish_evolution(
+    lib: FramsticksLib,
+    cache: evolvengine.cache.EvaluationCache | None,
+    end: bool = True,
+) -> dict | None:
+    if lib.dissimilarity_cache_misses > 0:
+        print("Dissimilarity cache: %s" % lib.dissimilarityCacheStats())
+    if cache is not None:
+        cache.close()
+    if lib.pool is not None:
+        lib.pool.close()
+    if end:
+        lib.end()
+        return None
+    # an island: its budget state is passed to FramsticksLib.endMerged() in the main process
+    if isinstance(lib, evolvengine.tracing.TracingLib):
+        lib.close()
+    return lib.getBudgetState()
+
+
+def main():
+    config = evolvengine.types.RunConfig.from_args()
+    if config.islands > 1:
+        # setup_evolution and finish_evolution run in the process of each island
+        budget_states = evolvengine.islands.run_islands(
+            config, setup_evolution, finish_evolution
+        )
+        FramsticksLib.endMerged(config.opt_func, budget_states)
+        return
+    lib, cache, toolbox, stats = setup_evolution(config)
     runner = evolvengine.runner.EvolutionRunner(config, toolbox, stats)
     runner.run()
-    lib.end()
+    finish_evolution(lib, cache)
 
 
 if __name__ == "__main__":
@@ -13,11 +13,12 @@ import json
 import os
 import argparse
 
+import evolvengine.results
+
 
 def parse_hof_file(hof_file: str, threshold: float = 0.0) -> list[str]:
-    with open(hof_file, "r") as f:
-        data = json.load(f)
-        hof = data["hof"]
+    # JSON documents, or JSON lines saved with -stream_results
+    hof = evolvengine.results.load_results(hof_file)["hof"]
 
     best_genotypes = []
     for ind in hof:
@@ -28,7 +29,7 @@ def parse_hof_file(hof_file: str, threshold: float = 0.0) -> list[str]:
 
 
 def main(results_dir: str, threshold: float = 0.0, output: str = "best_genotypes.json"):
-    hof_files = [f for f in os.listdir(results_dir) if f.endswith(".json")]
+    hof_files = [f for f in os.listdir(results_dir) if f.endswith((".json", ".jsonl"))]
 
     best_genotypes = []
     for hof_file in hof_files:
@@ -0,0 +1,376 @@
+import collections
+import functools
+import json
+import random
+import statistics
+import tempfile
+import time
+import warnings
+
+import deap.creator
+import deap.tools
+import numpy as np
+
+import paths
+import frams_evolve
+from FramsticksLib import FramsticksLib
+import evolvengine.algorithms
+import evolvengine.defaults
+import evolvengine.distances
+import evolvengine.mutator
+import evolvengine.randomizer
+import evolvengine.sketch
+import evolvengine.synthetic
+import evolvengine.timing
+import evolvengine.types
+
+# Overhead of evolvengine itself: the synthetic library replaces the simulator, so no Framsticks
+# installation is needed, and with zero costs all the measured time is spent in evolvengine
+# (set the costs to see how the overhead compares with a simulator of a given speed).
+N_GENERATIONS = 10
+N_REPEATS = 5  # of the mutator and dissimilarity measurements, the fastest is reported
+ALGS = ["SIMPLE", "MU_PLUS_LAMBDA", "MU_COMMA_LAMBDA", "DPGA"]
+POPSIZES = [50, 200, 1000, 5000]
+# parts of the genotypes for the mutator and dissimilarity measurements
+GENOTYPE_PARTS = (5, 30)
+# genotypes replaced between generations, for incremental dissimilarity
+CHANGED_FRACTION = 0.2
+# FramsticksLib compares pairs of genotypes one by one in Python, so the largest popsizes are left out
+FRAMS_DISSIMILARITY_POPSIZES = [50, 200, 1000]
+LIB_SETTINGS = dict(
+    mutate_cost=evolvengine.synthetic.CostModel(),
+    crossover_cost=evolvengine.synthetic.CostModel(),
+    evaluate_cost=evolvengine.synthetic.CostModel(),
+    dissimilarity_cost=evolvengine.synthetic.CostModel(),
+    mutate_invalid_rate=0.05,
+    crossover_invalid_rate=0.05,
+)
+
+
+def resolve_filename():
+    return paths.RESULTS_DIR / "bench" / f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+
+
+def make_lib(seed: int = 0) -> evolvengine.synthetic.SyntheticFramsticksLib:
+    return evolvengine.synthetic.SyntheticFramsticksLib(seed=seed, **LIB_SETTINGS)
+
+
+def make_config(alg: str, popsize: int, out: str) -> evolvengine.types.RunConfig:
+    # the defaults of RunConfig.from_args
+    return evolvengine.types.RunConfig(
+        path="",
+        sim="synthetic",
+        genformat="1",
+        initialgenotype=None,
+        opt=["vertpos"],
+        popsize=popsize,
+        generations=N_GENERATIONS,
+        tournament=5,
+        pmut=0.8,
+        pxov=0.2,
+        hof_size=10,
+        max_numparts=None,
+        max_numjoints=None,
+        max_numneurons=None,
+        max_numconnections=None,
+        max_numgenochars=None,
+        seed=0,
+        out=out,
+        meta=evolvengine.types.MetaAlgorithm(alg),
+        lambda_=1.2 if alg == "MU_COMMA_LAMBDA" else 0.8,
+        mutator_ub=1,
+        temp=0,
+        opt_func=3,
+        rand_prob=0.0,
+        dissimilarity_method=0,
+    )
+
+
+def bench_algorithm(alg: str, popsize: int, out: str) -> dict:
+    config = make_config(alg, popsize, out)
+    random.seed(config.seed)
+    np.random.seed(config.seed)
+    lib = make_lib(config.seed)
+    _, _, toolbox, stats = frams_evolve.setup_evolution(config, lib)
+    hof = deap.tools.HallOfFame(config.hof_size)
+    timer = evolvengine.timing.PhaseTimer()
+    timer.instrument(toolbox, stats, hof)
+    population = toolbox.population(n=popsize)
+    algorithm = evolvengine.algorithms.resolve_algorithm(config)
+    _, logbook = algorithm(
+        population,
+        toolbox,
+        cxpb=config.pxov,
+        mutpb=config.pmut,
+        ngen=config.generations,
+        stats=stats,
+        halloffame=hof,
+        verbose=False,
+    )
+    # generation 0 only evaluates the initial population
+    records = logbook[1:]
+    result = {
+        "alg": alg,
+        "popsize": popsize,
+        "generations": len(records),
+        "evaluations": lib.evaluation_count,
+        "s_per_gen": statistics.median(record["t_gen"] for record in records),
+    }
+    for phase in evolvengine.timing.PHASES:
+        result["s_" + phase] = statistics.median(
+            record["t_" + phase] for record in records
+        )
+    return result
+
+
+def fastest(func) -> float:
+    times = []
+    for _ in range(N_REPEATS):
+        time_start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - time_start)
+    return min(times)
+
+
+def make_genotypes(
+    lib: evolvengine.synthetic.SyntheticFramsticksLib, n: int
+) -> list[str]:
+    return [
+        lib.getRandomGenotype("X", *GENOTYPE_PARTS, 0, 5, 100, True) for _ in range(n)
+    ]
+
+
+def bench_mutators(popsize: int) -> dict:
+    lib = make_lib()
+    # creates deap.creator.Individual
+    evolvengine.defaults.setup_toolbox(lib, make_config("SIMPLE", popsize, None))
+    population = [deap.creator.Individual([g]) for g in make_genotypes(lib, popsize)]
+    vs_mutator = evolvengine.mutator.VaryingStrengthMutator(
+        mutate_func=evolvengine.defaults.frams_mutate
+    )
+    sa_mutator = evolvengine.mutator.SimulatedAnnealingMutator(
+        mutate_func=evolvengine.defaults.frams_mutate
+    )
+    randomizer = evolvengine.randomizer.Randomizer(probability=0.0, lib=lib)
+    mutators = {
+        "frams_mutate": evolvengine.defaults.frams_mutate,
+        "VaryingStrengthMutator": vs_mutator.mutate,
+        "SimulatedAnnealingMutator": sa_mutator.mutate,
+        # as registered by frams_evolve.setup_evolution
+        "Randomizer+VaryingStrength": lambda lib, x: randomizer.randomize(
+            vs_mutator.mutate(lib, x)
+        ),
+    }
+    result = {"popsize": popsize}
+    for name, mutate in mutators.items():
+        seconds = fastest(
+            lambda: [
+                mutate(lib, evolvengine.defaults.clone_individual(ind))
+                for ind in population
+            ]
+        )
+        result["us_" + name] = 1e6 * seconds / popsize
+    return result
+
+
+def bench_dissimilarity(popsize: int) -> dict:
+    lib = make_lib()
+    reserve_size = int(popsize * 0.6)  # RunConfig.reserve_ratio
+    genotypes = make_genotypes(lib, popsize)
+    reserve, main = genotypes[:reserve_size], genotypes[reserve_size:]
+
+    # the next generation: some genotypes of both populations are replaced by their mutants
+    def changed(population):
+        return [
+            lib.mutate([g])[0] if random.random() < CHANGED_FRACTION else g
+            for g in population
+        ]
+
+    next_reserve, next_main = changed(reserve), changed(main)
+    frams_between = functools.partial(
+        evolvengine.defaults.frams_dissimilarity_between, lib, method=0
+    )
+
+    def incremental():
+        distances = evolvengine.distances.DistanceMatrix(frams_between)
+        distances.get(reserve, main)
+        time_start = time.perf_counter()
+        distances.get(next_reserve, next_main)
+        return time.perf_counter() - time_start
+
+    def sketch():
+        # a new sketcher, so all the genotypes are sketched, as in the first generation
+        evolvengine.sketch.MinHashSketcher().dissimilarity_between(reserve, main)
+
+    sketcher = evolvengine.sketch.MinHashSketcher()
+    sketcher.dissimilarity_between(reserve, main)
+    return {
+        "popsize": popsize,
+        "pairs": len(reserve) * len(main),
+        "ms_frams_full": 1e3 * fastest(lambda: frams_between(reserve, main)),
+        "ms_frams_incremental": 1e3 * min(incremental() for _ in range(N_REPEATS)),
+        "ms_sketch_full": 1e3 * fastest(sketch),
+        "ms_sketch_incremental": 1e3
+        * fastest(lambda: sketcher.dissimilarity_between(next_reserve, next_main)),
+    }
+
+
+class SyntheticDensityDistribution:
+    """Stands for dissimilarity.density_distribution.DensityDistribution: the "voxels" of a genotype
+    are its synthetic dissimilarity profile, and computing them takes dissimilarity_cost.
+    """
+
+    def __init__(self, synthetic: evolvengine.synthetic.SyntheticFramsticksLib) -> None:
+        self.synthetic = synthetic
+        self.frequency = False
+
+    def getVoxels(self, genotype: str) -> np.ndarray:
+        self.synthetic.dissimilarity_cost.spend()
+        return self.synthetic.profiles([genotype])[0]
+
+    def calculateDissimforVoxels(
+        self, voxels1: np.ndarray, voxels2: np.ndarray
+    ) -> float:
+        return float(np.abs(voxels1 - voxels2).sum())
+
+
+class SimulatorFreeFramsticksLib(FramsticksLib):
+    """FramsticksLib.dissimilarity() as it is (upper triangle, pair cache, Levenshtein batch kernel,
+    voxel cache), but the Framsticks calls it makes for pairs of creatures and for voxels are
+    replaced by the synthetic library, so no Framsticks installation is needed."""
+
+    def __init__(self, synthetic: evolvengine.synthetic.SyntheticFramsticksLib) -> None:
+        # the attributes set by FramsticksLib.__init__, which also loads the Framsticks library
+        self.synthetic = synthetic
+        self.dissim_measure_density_distribution = None
+        self.pool = None
+        self._dissimilarity_cache = collections.OrderedDict()
+        self._geno_cache = collections.OrderedDict()
+        self._voxels_cache = collections.OrderedDict()
+        self.dissimilarity_cache_hits = 0
+        self.dissimilarity_cache_misses = 0
+
+    def _pairDistanceFunction(self, genotype_list: list[str], method: int):
+        if method == -1:
+            return super()._pairDistanceFunction(genotype_list, method)
+        profiles = self.synthetic.profiles(genotype_list)
+
+        def distance(i, j):
+            self.synthetic.dissimilarity_cost.spend()
+            return float(np.abs(profiles[i] - profiles[j]).sum())
+
+        return distance
+
+    def _prepareDensityDistribution(self, method: int) -> None:
+        if self.dissim_measure_density_distribution is None:
+            self.dissim_measure_density_distribution = SyntheticDensityDistribution(
+                self.synthetic
+            )
+        self.dissim_measure_density_distribution.frequency = method == -3
+
+
+def bench_frams_dissimilarity(popsize: int) -> dict:
+    synthetic = make_lib()
+    lib = SimulatorFreeFramsticksLib(synthetic)
+    genotypes = make_genotypes(synthetic, popsize)
+    # the next generation: some genotypes are replaced by their mutants
+    next_genotypes = [
+        synthetic.mutate([g])[0] if random.random() < CHANGED_FRACTION else g
+        for g in genotypes
+    ]
+    upper_pairs = [(i, j) for i in range(popsize) for j in range(i + 1, popsize)]
+
+    def full(method):
+        # the first generation: nothing is cached yet
+        lib.clearDissimilarityCache()
+        lib.dissimilarity(genotypes, method)
+
+    def both_triangles():
+        # all pairs and no cache, as before only the upper triangle was computed
+        lib.CHECK_DISSIMILARITY_SYMMETRY = True
+        try:
+            lib.dissimilarity(genotypes, 0)
+        finally:
+            lib.CHECK_DISSIMILARITY_SYMMETRY = False
+
+    def next_generation(method):
+        lib.clearDissimilarityCache()
+        lib.dissimilarity(genotypes, method)
+        time_start = time.perf_counter()
+        lib.dissimilarity(next_genotypes, method)
+        return time.perf_counter() - time_start
+
+    return {
+        "popsize": popsize,
+        "pairs": len(upper_pairs),
+        "ms_levenshtein_pairs": 1e3
+        * fastest(
+            lambda: lib.dissimilarityPairs(genotypes, -1, upper_pairs, use_cache=False)
+        ),
+        "ms_levenshtein_batch": 1e3 * fastest(lambda: lib.dissimilarity(genotypes, -1)),
+        "ms_phenetic_both": 1e3 * fastest(both_triangles),
+        "ms_phenetic_upper": 1e3 * fastest(lambda: full(0)),
+        "ms_phenetic_next": 1e3 * min(next_generation(0) for _ in range(N_REPEATS)),
+        "ms_density_upper": 1e3 * fastest(lambda: full(-2)),
+        "ms_density_next": 1e3 * min(next_generation(-2) for _ in range(N_REPEATS)),
+    }
+
+
+def print_table(title: str, rows: list[dict]) -> None:
+    print(title)
+    widths = [max(12, len(column)) for column in rows[0]]
+    print("  " + " ".join("%*s" % (w, c) for w, c in zip(widths, rows[0])))
+    for row in rows:
+        values = [
+            "%.4g" % value if isinstance(value, float) else str(value)
+            for value in row.values()
+        ]
+        print("  " + " ".join("%*s" % (w, v) for w, v in zip(widths, values)))
+
+
+def main():
+    # setup_toolbox creates the deap classes again for every configuration
+    warnings.filterwarnings("ignore", category=RuntimeWarning, module="deap.creator")
+    results = {
+        "algorithms": [],
+        "mutators": [],
+        "dissimilarity": [],
+        "frams_dissimilarity": [],
+    }
+    with tempfile.TemporaryDirectory() as out_dir:
+        for alg in ALGS:
+            for popsize in POPSIZES:
+                print(f"Running {alg} with popsize {popsize}...")
+                # DPGA saves partial results to config.out
+                out = f"{out_dir}/{alg}-{popsize}.json"
+                results["algorithms"].append(bench_algorithm(alg, popsize, out))
+    for popsize in POPSIZES:
+        results["mutators"].append(bench_mutators(popsize))
+        results["dissimilarity"].append(bench_dissimilarity(popsize))
+    for popsize in FRAMS_DISSIMILARITY_POPSIZES:
+        results["frams_dissimilarity"].append(bench_frams_dissimilarity(popsize))
+
+    print_table("Seconds per generation (median):", results["algorithms"])
+    print_table("Microseconds per mutated individual:", results["mutators"])
+    print_table(
+        "Milliseconds per reserve x main dissimilarity:", results["dissimilarity"]
+    )
+    print_table(
+        "Milliseconds per FramsticksLib.dissimilarity matrix:",
+        results["frams_dissimilarity"],
+    )
+
+    filename = resolve_filename()
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    results["settings"] = {
+        "generations": N_GENERATIONS,
+        "repeats": N_REPEATS,
+        "lib": {key: str(value) for key, value in LIB_SETTINGS.items()},
+    }
+    with open(filename, "w") as outfile:
+        json.dump(results, outfile, indent=2)
+    print(f"Saved results to '{filename}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
 import dataclasses
 import glob
-import json
 import pathlib
+import sys
 import typing
 
 import pandas as pd
 import numpy as np
 
+# the notebooks import this module from vis/, the results format is read by evolvengine
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+from evolvengine.results import load_results
+
 
 @dataclasses.dataclass
 class GenInstance:
@@ -24,6 +28,28 @@ class HistoryEntry:
     max: float
     m_strength: float = 1.0
     m_temp: float = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cache_f0_hits: int = 0
+    screened: int = 0
+    nsaved: int = 0
+    proxy_agreement: float = float("nan")
+    # phase timing (-timing), in seconds
+    t_select: float = float("nan")
+    t_mutate: float = float("nan")
+    t_mate: float = float("nan")
+    t_evaluate: float = float("nan")
+    t_dissimilarity: float = float("nan")
+    t_stats: float = float("nan")
+    t_hof: float = float("nan")
+    t_io: float = float("nan")
+    t_gen: float = float("nan")
+
+    @classmethod
+    def from_record(cls, record: dict[str, typing.Any]) -> "HistoryEntry":
+        # logbook columns depend on the features enabled in a run, ignore the ones we do not know
+        names = {field.name for field in dataclasses.fields(cls)}
+        return cls(**{k: v for k, v in record.items() if k in names})
 
 
 @dataclasses.dataclass
@@ -48,15 +74,14 @@ def import_from_dir(
         dir = pathlib.Path(dir)
     if not dir.exists():
         raise FileNotFoundError(f"Directory {dir} does not exist.")
-    result_files = glob.glob(str(dir / "*.json"))
+    result_files = glob.glob(str(dir / "*.json")) + glob.glob(str(dir / "*.jsonl"))
     results = {}
     for file in result_files:
-        with open(file, "r") as f:
-            data = json.load(f)
+        data = load_results(file)
         best_instances = [
             GenInstance(x["genotype"], x["fitness"][0]) for x in data["hof"]
         ]
-        history_entries = [HistoryEntry(**x) for x in data["log"]]
+        history_entries = [HistoryEntry.from_record(x) for x in data["log"]]
         run_res = RunResult(
             history=history_entries,
             time_s=data["time_s"],